@@ -0,0 +1 @@
+"""Benchmarks and harnesses for the crafting package. Not part of the installed package."""
@@ -0,0 +1,167 @@
+"""
+Time the crafting hot paths against a synthetic catalog in an in-memory SQLite database.
+
+    python -m benchmarks.bench_crafting --recipes 2000 --balls 800 --output bench.json
+    python -m benchmarks.bench_crafting --baseline bench.json --threshold 0.25
+
+Results are written as JSON so runs can be compared across commits. With `--baseline`,
+the run fails (exit code 1) when a median is more than `--threshold` slower.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Awaitable, Callable, Dict
+
+from benchmarks.environment import FakeInteraction, FakeMessage, close_database, init_database, install_ballsdex_stubs
+
+
+async def measure(func: Callable[[], Awaitable], repeat: int, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        await func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+        "runs": repeat,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    from benchmarks import synthetic
+    from crafting.catalog import build_catalog, warm_up
+    from crafting.crafting_utils import update_crafting_display
+    from crafting.logic import can_craft_recipe, determine_ingredient_usage, find_matching_recipes
+    from crafting.session_manager import crafting_sessions
+    from crafting.unit_of_work import get_recipes
+
+    rng = random.Random(args.seed)
+    await init_database()
+    try:
+        ball_ids = await synthetic.create_balls(args.balls)
+        options = await synthetic.create_catalog(rng, ball_ids, args.recipes, args.max_group_size)
+        catalog = await build_catalog()
+        # The bot warms the shared catalog up at cog load; without it the commands wait for it
+        await warm_up()
+
+        player = await synthetic.create_player(1)
+        await synthetic.create_instances(rng, player, rng.choices(ball_ids, k=args.inventory))
+        session_balls, targets = synthetic.session_ball_ids(
+            rng, list(catalog.recipes.values()), ball_ids, args.session_size
+        )
+        session_ids = await synthetic.create_instances(rng, player, session_balls)
+        counts: Dict[int, int] = {}
+        for ball_id in session_balls:
+            counts[ball_id] = counts.get(ball_id, 0) + 1
+
+        recipes = await get_recipes()
+        target = next(r for r in recipes if r.pk == targets[0].id)
+
+        async def can_craft_all():
+            for recipe in recipes:
+                await can_craft_recipe(recipe, counts)
+
+        crafting_sessions[player.discord_id] = {
+            'player': player,
+            'ingredient_instances': session_ids,
+            'special': None,
+            'message': FakeMessage(),
+        }
+
+        async def display():
+            await update_crafting_display(FakeInteraction(player.discord_id), player.discord_id)
+
+        print(
+            f"Catalog: {args.recipes} recipes, {args.balls} balls, {options} group options; "
+            f"session of {len(session_ids)}, inventory of {args.inventory}",
+            file=sys.stderr,
+        )
+        return {
+            "find_matching_recipes": await measure(lambda: find_matching_recipes(session_ids), args.repeat),
+            "can_craft_recipe": await measure(can_craft_all, args.repeat),
+            "determine_ingredient_usage": await measure(
+                lambda: determine_ingredient_usage(target, session_ids), args.repeat
+            ),
+            "update_crafting_display": await measure(display, args.repeat),
+        }
+    finally:
+        await close_database()
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        ratio = result["median_ms"] / max(before["median_ms"], 1e-6)
+        print(f"{name:28} {before['median_ms']:9.2f}ms -> {result['median_ms']:9.2f}ms ({ratio - 1:+.0%})")
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipes", type=int, default=1000)
+    parser.add_argument("--balls", type=int, default=500)
+    parser.add_argument("--max-group-size", type=int, default=500)
+    parser.add_argument("--session-size", type=int, default=30)
+    parser.add_argument("--inventory", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with a previous JSON output")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+
+    install_ballsdex_stubs()
+    results = asyncio.run(run(args))
+
+    output = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "parameters": {
+            k: getattr(args, k)
+            for k in ("recipes", "balls", "max_group_size", "session_size", "inventory", "repeat", "seed")
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != output["parameters"]:
+            print("Warning: baseline was run with different parameters", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regression over {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Local stand-in for the parts of BallsDex the crafting package imports, plus fake
+discord objects, so crafting code can run against an in-memory SQLite database.
+
+Call `install_ballsdex_stubs()` before importing anything from `crafting`.
+Needs discord.py and tortoise-orm installed; BallsDex itself is not needed.
+"""
+import asyncio
+import enum
+import random
+import sys
+import types
+from typing import Any, List, Optional
+
+MODEL_MODULES = ["benchmarks.stub_models", "crafting.models"]
+
+
+def _module(name: str, **attributes) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    if "." not in name or attributes.get("__path__") is not None:
+        module.__path__ = []
+    sys.modules[name] = module
+    return module
+
+
+def install_ballsdex_stubs(**settings_overrides):
+    """Register fake `ballsdex.*` modules. Safe to call more than once."""
+    if "ballsdex.core.models" in sys.modules:
+        return
+
+    from discord import app_commands
+    from discord.ext import commands
+
+    from benchmarks import stub_models
+
+    class _PkTransformer(app_commands.Transformer):
+        model: Any = None
+
+        async def transform(self, interaction, value):
+            return await self.model.get(pk=int(value))
+
+    class BallTransformer(_PkTransformer):
+        model = stub_models.Ball
+
+    class BallInstanceTransformer(_PkTransformer):
+        model = stub_models.BallInstance
+
+    class SpecialTransformer(_PkTransformer):
+        model = stub_models.Special
+
+    class TradeCommandType(enum.Enum):
+        PICK = 0
+        REMOVE = 1
+
+    settings = types.SimpleNamespace(
+        bot_name="BenchDex",
+        max_attack_bonus=20,
+        max_health_bonus=20,
+        players_group_cog_name="balls",
+    )
+    settings.__dict__.update(settings_overrides)
+
+    def draw_card(ball_instance, media_path: str = ""):
+        from PIL import Image
+
+        return Image.new("RGB", (1428, 2000)), {"format": "PNG"}
+
+    _module("ballsdex")
+    _module("ballsdex.core", __path__=[])
+    sys.modules["ballsdex.core.models"] = stub_models
+    _module("ballsdex.settings", settings=settings)
+    _module("ballsdex.core.utils", __path__=[])
+    _module(
+        "ballsdex.core.utils.transformers",
+        BallTransform=app_commands.Transform[stub_models.Ball, BallTransformer],
+        BallEnabledTransform=app_commands.Transform[stub_models.Ball, BallTransformer],
+        BallInstanceTransform=app_commands.Transform[stub_models.BallInstance, BallInstanceTransformer],
+        SpecialEnabledTransform=app_commands.Transform[stub_models.Special, SpecialTransformer],
+        TradeCommandType=TradeCommandType,
+    )
+    _module("ballsdex.core.bot", BallsDexBot=commands.Bot)
+    _module("ballsdex.core.image_generator", __path__=[])
+    _module("ballsdex.core.image_generator.image_gen", draw_card=draw_card)
+
+
+async def init_database(url: str = "sqlite://:memory:"):
+    """Initialise Tortoise with the stub and crafting models and create the tables."""
+    from tortoise import Tortoise
+
+    await Tortoise.init(
+        config={
+            "connections": {"default": url},
+            "apps": {"models": {"models": MODEL_MODULES, "default_connection": "default"}},
+        }
+    )
+    await Tortoise.generate_schemas()
+
+
+async def close_database():
+    from tortoise import Tortoise
+
+    await Tortoise.close_connections()
+
+
+# ---- fake discord objects ----
+
+class FakeDiscordAPI:
+    """
+    Simulated Discord HTTP latency. A fraction of calls hits a 429, which discord.py
+    absorbs by sleeping `retry_after` and retrying, so it shows up as extra latency.
+    """
+
+    def __init__(self, latency: float = 0.0, rate_limit_probability: float = 0.0, retry_after: float = 1.0, seed=None):
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.rate_limited = 0
+
+    async def call(self):
+        self.calls += 1
+        if self.rate_limit_probability and self.rng.random() < self.rate_limit_probability:
+            self.rate_limited += 1
+            await asyncio.sleep(self.retry_after)
+        if self.latency:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.latency)
+
+
+NO_LATENCY = FakeDiscordAPI()
+
+
+class FakeMessage:
+    _next_id = 1
+
+    def __init__(self, content: Optional[str] = None, embed=None, view=None, api: FakeDiscordAPI = NO_LATENCY):
+        self.id = FakeMessage._next_id
+        FakeMessage._next_id += 1
+        self.content = content
+        self.embed = embed
+        self.view = view
+        self.embeds = [embed] if embed else []
+        self.edits = 0
+        self.api = api
+
+    async def edit(self, **kwargs):
+        await self.api.call()
+        self.edits += 1
+        self.embed = kwargs.get("embed", self.embed)
+        self.view = kwargs.get("view", self.view)
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self, **kwargs):
+        if self._done:
+            raise RuntimeError("Interaction already responded to")
+        self._done = True
+        await self.interaction.api.call()
+        self.interaction.sent.append(kwargs)
+
+    async def defer(self, **kwargs):
+        await self._respond(deferred=True, **kwargs)
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond(content=content, **kwargs)
+
+    async def edit_message(self, **kwargs):
+        await self._respond(edit=True, **kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self.interaction.api.call()
+        self.interaction.sent.append(dict(content=content, **kwargs))
+        return FakeMessage(content, kwargs.get("embed"), kwargs.get("view"), self.interaction.api)
+
+
+class FakeChannel:
+    def history(self, limit: int = 50):
+        async def empty():
+            return
+            yield
+
+        return empty()
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.display_name = f"user{user_id}"
+
+
+class FakeClient:
+    def __init__(self, owner_ids=()):
+        self.user = FakeUser(0)
+        self.owner_ids = set(owner_ids)
+
+    def get_emoji(self, emoji_id):
+        return None
+
+    async def is_owner(self, user) -> bool:
+        return user.id in self.owner_ids
+
+
+class FakeInteraction:
+    """Just enough of `discord.Interaction` for the crafting commands and views."""
+
+    def __init__(
+        self, user_id: int, client: Optional[FakeClient] = None, api: FakeDiscordAPI = NO_LATENCY, guild_id=None
+    ):
+        self.user = FakeUser(user_id)
+        self.client = client or FakeClient()
+        self.channel = FakeChannel()
+        self.guild_id = guild_id
+        self.guild = None
+        self.api = api
+        self.sent: List[dict] = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, **kwargs):
+        await self.api.call()
+        self.sent.append(dict(edit_original=True, **kwargs))
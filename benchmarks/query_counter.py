@@ -0,0 +1,90 @@
+"""Count and time the SQL statements Tortoise sends while a block of code runs."""
+import contextvars
+import functools
+import time
+from typing import List, Optional, Tuple
+
+EXECUTE_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+
+# Set while inside a wrapped call, so a client method calling another one counts once
+_inside = contextvars.ContextVar("query_counter_inside", default=False)
+
+
+def _client_classes(cls) -> List[type]:
+    classes = [cls]
+    for subclass in cls.__subclasses__():
+        classes += _client_classes(subclass)
+    return classes
+
+
+class QueryCounter:
+    """
+    Wraps the execute methods of the connection's client class (and its subclasses, which
+    covers transaction wrappers) while active::
+
+        with QueryCounter() as counter:
+            await do_something()
+        print(counter.count, counter.total_ms)
+    """
+
+    def __init__(self, connection_name: str = "default"):
+        self.connection_name = connection_name
+        self.queries: List[Tuple[str, float]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._patched: List[Tuple[type, str, object]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(duration for _, duration in self.queries)
+
+    def reset(self):
+        self.queries.clear()
+        self.max_in_flight = self.in_flight
+
+    def _wrap(self, method):
+        counter = self
+
+        @functools.wraps(method)
+        async def wrapper(client, query, *args, **kwargs):
+            if _inside.get():
+                return await method(client, query, *args, **kwargs)
+            token = _inside.set(True)
+            counter.in_flight += 1
+            counter.max_in_flight = max(counter.max_in_flight, counter.in_flight)
+            start = time.perf_counter()
+            try:
+                return await method(client, query, *args, **kwargs)
+            finally:
+                counter.in_flight -= 1
+                counter.queries.append((str(query), (time.perf_counter() - start) * 1000))
+                _inside.reset(token)
+
+        return wrapper
+
+    def __enter__(self) -> "QueryCounter":
+        from tortoise import connections
+
+        client_class = type(connections.get(self.connection_name))
+        while client_class.__base__ is not None and "execute_query" not in client_class.__dict__:
+            client_class = client_class.__base__
+        for cls in _client_classes(client_class):
+            for name in EXECUTE_METHODS:
+                if name in cls.__dict__:
+                    original = cls.__dict__[name]
+                    self._patched.append((cls, name, original))
+                    setattr(cls, name, self._wrap(original))
+        return self
+
+    def __exit__(self, *exc_info) -> Optional[bool]:
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched.clear()
+        return None
+
+    def report(self) -> str:
+        return "\n".join(f"{duration:8.2f}ms  {query[:160]}" for query, duration in self.queries)
@@ -0,0 +1,106 @@
+"""
+Minimal Tortoise versions of the BallsDex models the crafting package touches.
+Installed as `ballsdex.core.models` by `benchmarks.environment`; only the fields crafting reads exist.
+"""
+from datetime import timedelta
+
+from tortoise import fields, models, timezone
+
+
+class Special(models.Model):
+    id = fields.IntField(pk=True)
+    name = fields.CharField(max_length=64)
+    emoji = fields.CharField(max_length=64, null=True)
+
+    class Meta:
+        table = "special"
+
+
+class Ball(models.Model):
+    id = fields.IntField(pk=True)
+    country = fields.CharField(max_length=48)
+    emoji_id = fields.BigIntField(default=0)
+    enabled = fields.BooleanField(default=True)
+    attack = fields.IntField(default=100)
+    health = fields.IntField(default=100)
+
+    class Meta:
+        table = "ball"
+
+    def __str__(self) -> str:
+        return self.country
+
+
+class Player(models.Model):
+    id = fields.IntField(pk=True)
+    discord_id = fields.BigIntField(unique=True)
+
+    class Meta:
+        table = "player"
+
+
+class BallInstance(models.Model):
+    id = fields.IntField(pk=True)
+    ball = fields.ForeignKeyField("models.Ball", related_name="instances")
+    player = fields.ForeignKeyField("models.Player", related_name="balls")
+    special = fields.ForeignKeyField("models.Special", null=True, related_name="instances")
+    attack_bonus = fields.IntField(default=0)
+    health_bonus = fields.IntField(default=0)
+    locked = fields.DatetimeField(null=True, default=None)
+    catch_date = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "ballinstance"
+
+    @property
+    def countryball(self):
+        return balls.get(self.ball_id)
+
+    async def is_locked(self) -> bool:
+        await self.refresh_from_db(fields=("locked",))
+        return self.locked is not None and self.locked + timedelta(minutes=30) > timezone.now()
+
+    async def lock_for_trade(self):
+        self.locked = timezone.now()
+        await self.save(update_fields=("locked",))
+
+    async def unlock(self):
+        self.locked = None
+        await self.save(update_fields=("locked",))
+
+
+class Trade(models.Model):
+    id = fields.IntField(pk=True)
+    player1 = fields.ForeignKeyField("models.Player", related_name="trades")
+    player2 = fields.ForeignKeyField("models.Player", related_name="trades2")
+    date = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "trade"
+
+
+class TradeObject(models.Model):
+    id = fields.IntField(pk=True)
+    trade = fields.ForeignKeyField("models.Trade", related_name="tradeobjects")
+    ballinstance = fields.ForeignKeyField("models.BallInstance", related_name="tradeobjects")
+    player = fields.ForeignKeyField("models.Player", related_name="tradeobjects")
+
+    class Meta:
+        table = "tradeobject"
+
+
+# Not used by crafting, only imported
+class BlacklistedGuild:
+    pass
+
+
+class BlacklistedID:
+    pass
+
+
+class GuildConfig:
+    pass
+
+
+balls: dict = {}
+specials: dict = {}
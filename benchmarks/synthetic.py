@@ -0,0 +1,101 @@
+"""Synthetic crafting catalogs, inventories and sessions for the benchmarks."""
+import math
+import random
+from typing import List, Tuple
+
+from benchmarks.stub_models import Ball, BallInstance, Player, balls
+from crafting.compiled import CompiledRecipe
+from crafting.models import CraftingGroupOption, CraftingIngredient, CraftingIngredientGroup, CraftingRecipe
+
+
+def group_size(rng: random.Random, max_size: int) -> int:
+    """Log-uniform between 1 and `max_size`: most groups are small, a few are huge."""
+    return max(1, min(max_size, int(math.exp(rng.uniform(0, math.log(max_size + 1))))))
+
+
+async def create_balls(count: int) -> List[int]:
+    await Ball.bulk_create([Ball(id=i, country=f"Ball {i}", emoji_id=i) for i in range(1, count + 1)])
+    for ball in await Ball.all():
+        balls[ball.pk] = ball
+    return list(range(1, count + 1))
+
+
+async def create_catalog(
+    rng: random.Random, ball_ids: List[int], recipes: int, max_group_size: int = 500, pools: int = 8
+) -> int:
+    """
+    Create `recipes` recipes with 0-3 fixed ingredients and 0-2 groups. Group options are
+    drawn from a few shared pools of balls so groups of different recipes overlap.
+    Returns the number of group options created.
+    """
+    pool_list = [ball_ids[i::pools] for i in range(pools)]
+    recipe_rows, ingredient_rows, group_rows, option_rows = [], [], [], []
+    group_id = 0
+    for recipe_id in range(1, recipes + 1):
+        recipe_rows.append(CraftingRecipe(id=recipe_id, result_id=rng.choice(ball_ids)))
+        fixed = rng.sample(ball_ids, rng.randint(0, 3))
+        for ball_id in fixed:
+            ingredient_rows.append(
+                CraftingIngredient(recipe_id=recipe_id, ingredient_id=ball_id, quantity=rng.randint(1, 3))
+            )
+        for _ in range(rng.randint(0 if fixed else 1, 2)):
+            group_id += 1
+            group_rows.append(
+                CraftingIngredientGroup(
+                    id=group_id, recipe_id=recipe_id, name=f"Group {group_id}", required_count=rng.randint(1, 3)
+                )
+            )
+            pool = rng.choice(pool_list)
+            for ball_id in rng.sample(pool, min(len(pool), group_size(rng, max_group_size))):
+                option_rows.append(CraftingGroupOption(group_id=group_id, ball_id=ball_id))
+
+    await CraftingRecipe.bulk_create(recipe_rows, batch_size=1000)
+    await CraftingIngredient.bulk_create(ingredient_rows, batch_size=1000)
+    await CraftingIngredientGroup.bulk_create(group_rows, batch_size=1000)
+    await CraftingGroupOption.bulk_create(option_rows, batch_size=1000)
+    return len(option_rows)
+
+
+async def create_player(discord_id: int) -> Player:
+    return await Player.create(discord_id=discord_id)
+
+
+async def create_instances(rng: random.Random, player: Player, ball_ids: List[int], special=None) -> List[int]:
+    """Create one instance per entry of `ball_ids` (repeat ids for duplicates)."""
+    first = (await BallInstance.all().order_by("-id").first())
+    next_id = (first.pk if first else 0) + 1
+    rows = [
+        BallInstance(
+            id=next_id + i,
+            ball_id=ball_id,
+            player_id=player.pk,
+            special_id=special.pk if special else None,
+            attack_bonus=rng.randint(-20, 20),
+            health_bonus=rng.randint(-20, 20),
+        )
+        for i, ball_id in enumerate(ball_ids)
+    ]
+    await BallInstance.bulk_create(rows, batch_size=1000)
+    return [row.pk for row in rows]
+
+
+def witness(rng: random.Random, recipe: CompiledRecipe) -> List[int]:
+    """Ball ids of a session that satisfies `recipe`."""
+    ball_ids = []
+    for ball_id, quantity in recipe.fixed.items():
+        ball_ids += [ball_id] * quantity
+    for required, options in recipe.groups:
+        ball_ids += rng.choices(sorted(options), k=required)
+    return ball_ids
+
+
+def session_ball_ids(
+    rng: random.Random, recipes: List[CompiledRecipe], ball_ids: List[int], size: int, matching: int = 1
+) -> Tuple[List[int], List[CompiledRecipe]]:
+    """Ball ids for a session of about `size` balls that satisfies `matching` random recipes."""
+    targets = rng.sample(recipes, min(matching, len(recipes)))
+    session = []
+    for recipe in targets:
+        session += witness(rng, recipe)
+    session += rng.choices(ball_ids, k=max(0, size - len(session)))
+    return session, targets
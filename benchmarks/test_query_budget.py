@@ -0,0 +1,127 @@
+"""
+Query budget per crafting command: every command must run a bounded number of SQL
+statements that does not grow with the catalog size or the session size.
+
+    python -m pytest benchmarks/test_query_budget.py -q
+
+Runs against stub BallsDex models and in-memory SQLite (see `benchmarks.environment`).
+"""
+import asyncio
+import random
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("tortoise")
+
+from benchmarks.environment import (  # noqa: E402
+    FakeClient,
+    FakeInteraction,
+    close_database,
+    init_database,
+    install_ballsdex_stubs,
+)
+from benchmarks.query_counter import QueryCounter  # noqa: E402
+
+install_ballsdex_stubs()
+
+from benchmarks import synthetic  # noqa: E402
+from benchmarks.stub_models import BallInstance  # noqa: E402
+from crafting.catalog import refresh_catalog  # noqa: E402
+from crafting.cog import Craft  # noqa: E402
+from crafting.crafting_views import CraftingView  # noqa: E402
+from crafting.models import CraftingIngredient, CraftingRecipe  # noqa: E402
+from crafting.session_manager import crafting_sessions  # noqa: E402
+
+# Maximum number of SQL statements per command, whatever the catalog and session size
+BUDGETS = {
+    "begin": 2,
+    "add": 11,  # includes the UPDATE reserving the added balls
+    "add_bulk": 11,
+    "remove": 10,
+    "clear": 1,
+    "recipes": 7,
+    "recipes_for_ball": 7,
+    "craft": 13,
+}
+
+SMALL = dict(recipes=20, balls=40, session_size=3)
+LARGE = dict(recipes=400, balls=300, session_size=25)
+
+
+async def measure_commands(recipes: int, balls: int, session_size: int) -> dict:
+    rng = random.Random(1)
+    await init_database()
+    crafting_sessions.clear()
+    try:
+        ball_ids = await synthetic.create_balls(balls + 12)
+        # Filler balls used by no recipe and two balls only used by the target recipe,
+        # so the craft below has exactly one match
+        catalog_balls, inert_balls, target_balls = ball_ids[:balls], ball_ids[balls:-2], ball_ids[-2:]
+        await synthetic.create_catalog(rng, catalog_balls, recipes, max_group_size=50)
+        target = await CraftingRecipe.create(result_id=ball_ids[0])
+        for ball_id in target_balls:
+            await CraftingIngredient.create(recipe=target, ingredient_id=ball_id, quantity=1)
+
+        # The compiled catalog is process-wide and rebuilt every few minutes, not per command
+        await refresh_catalog()
+
+        player = await synthetic.create_player(1)
+        filler = await synthetic.create_instances(rng, player, rng.choices(inert_balls, k=session_size))
+        recipe_ingredients = await synthetic.create_instances(rng, player, target_balls)
+        extra = (await synthetic.create_instances(rng, player, [ball_ids[0]]))[0]
+
+        client = FakeClient()
+        cog = Craft(client)
+        counts = {}
+
+        async def run(name, coro_factory):
+            interaction = FakeInteraction(player.discord_id, client)
+            with QueryCounter() as counter:
+                await coro_factory(interaction)
+            counts[name] = counter
+            return interaction
+
+        await run("begin", lambda i: cog.craft_begin.callback(cog, i, None))
+        await run("add_bulk", lambda i: cog.craft_add.callback(
+            cog, i, ids=", ".join(f"{pk:X}" for pk in filler + recipe_ingredients)))
+        countryball = await BallInstance.get(pk=extra)
+        await run("add", lambda i: cog.craft_add.callback(cog, i, countryball=countryball))
+        await run("remove", lambda i: cog.craft_remove.callback(cog, i, countryball=countryball))
+        await run("recipes", lambda i: cog.craft_recipes.callback(cog, i, None))
+        ball = await synthetic.Ball.get(pk=ball_ids[0])
+        await run("recipes_for_ball", lambda i: cog.craft_recipes.callback(cog, i, ball))
+
+        session = crafting_sessions[player.discord_id]
+        view = CraftingView(client, player, session)
+        interaction = await run("craft", lambda i: view.craft_button.callback(i))
+        assert any(
+            sent.get("embed") and "Successful" in sent["embed"].title for sent in interaction.sent
+        ), interaction.sent
+
+        # The craft ends the session and releases the filler balls it did not use
+        assert player.discord_id not in crafting_sessions
+        assert not await BallInstance.filter(id__in=filler, locked__isnull=False).exists()
+
+        await cog.craft_begin.callback(cog, FakeInteraction(player.discord_id, client), None)
+        await cog.craft_add.callback(
+            cog, FakeInteraction(player.discord_id, client), ids=", ".join(f"{pk:X}" for pk in filler))
+        await run("clear", lambda i: cog.craft_clear.callback(cog, i))
+        return counts
+    finally:
+        await close_database()
+
+
+@pytest.fixture(scope="module")
+def query_counts():
+    return asyncio.run(measure_commands(**SMALL)), asyncio.run(measure_commands(**LARGE))
+
+
+@pytest.mark.parametrize("size", ("small", "large"))
+@pytest.mark.parametrize("command", sorted(BUDGETS))
+def test_query_budget(query_counts, command, size):
+    counter = query_counts[size == "large"][command]
+    assert counter.count <= BUDGETS[command], (
+        f"{command} ({size}): {counter.count} queries in {counter.total_ms:.1f}ms, "
+        f"budget is {BUDGETS[command]}\n{counter.report()}"
+    )
@@ -0,0 +1,139 @@
+"""
+Reservations of crafting session ingredients (`crafting.reservations`): what a session
+may lock, what it releases, and what the craft refuses.
+
+    python -m pytest benchmarks/test_reservations.py -q
+
+Runs against stub BallsDex models and in-memory SQLite (see `benchmarks.environment`).
+"""
+import asyncio
+import random
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("tortoise")
+
+from tortoise import timezone  # noqa: E402
+
+from benchmarks.environment import close_database, init_database, install_ballsdex_stubs  # noqa: E402
+
+install_ballsdex_stubs()
+
+from benchmarks import synthetic  # noqa: E402
+from benchmarks.stub_models import BallInstance  # noqa: E402
+from crafting.craft_executor import CraftRejected, craft_executor  # noqa: E402
+from crafting.reservations import LOCK_DURATION, release, reserve  # noqa: E402
+
+
+def _session(player) -> dict:
+    return {'player': player, 'ingredient_instances': [], 'reserved_at': None, 'special': None}
+
+
+def run(test):
+    """Run `test(players, instance_ids)` with two players owning 6 balls each."""
+
+    async def main():
+        rng = random.Random(1)
+        await init_database()
+        try:
+            ball_ids = await synthetic.create_balls(3)
+            players = [await synthetic.create_player(discord_id) for discord_id in (1, 2)]
+            instance_ids = [await synthetic.create_instances(rng, player, ball_ids * 2) for player in players]
+            return await test(players, instance_ids)
+        finally:
+            await close_database()
+
+    return asyncio.run(main())
+
+
+async def _add(session, ids):
+    reserved = await reserve(session, ids)
+    session['ingredient_instances'] += sorted(reserved)
+    return reserved
+
+
+def _craft(session, ids):
+    result = BallInstance(player=session['player'], ball_id=1, attack_bonus=0, health_bonus=0)
+    return craft_executor.submit(session, ids, result)
+
+
+async def _locked(ids):
+    return dict(await BallInstance.filter(id__in=ids).values_list("id", "locked"))
+
+
+@pytest.mark.parametrize("change", ("traded", "given", "trade_locked"))
+def test_craft_rejects_balls_no_longer_held(change):
+    async def test(players, instance_ids):
+        session = _session(players[0])
+        ids = instance_ids[0][:2]
+        assert await _add(session, ids) == set(ids)
+
+        ball = BallInstance.filter(id=ids[0])
+        if change == "traded":
+            # A completed trade moves the ball and unlocks it
+            await ball.update(player_id=players[1].pk, locked=None)
+        elif change == "given":
+            await ball.update(player_id=players[1].pk)
+        else:
+            # Another trade took the lock over (e.g. a stale reservation was overwritten)
+            await ball.update(locked=timezone.now())
+
+        with pytest.raises(CraftRejected):
+            await _craft(session, ids)
+        # Nothing was consumed
+        assert await BallInstance.filter(id__in=ids).count() == 2
+
+    run(test)
+
+
+def test_craft_consumes_held_balls():
+    async def test(players, instance_ids):
+        session = _session(players[0])
+        ids = instance_ids[0][:2]
+        await _add(session, ids)
+        result = await _craft(session, ids)
+        assert result.pk is not None
+        assert await BallInstance.filter(id__in=ids).count() == 0
+
+    run(test)
+
+
+def test_release_clears_only_the_session_stamps():
+    async def test(players, instance_ids):
+        first, second = _session(players[0]), _session(players[1])
+        await _add(first, instance_ids[0][:2])
+        await _add(second, instance_ids[1][:2])
+        trade_lock = timezone.now() - timedelta(minutes=1)
+        await BallInstance.filter(id=instance_ids[0][2]).update(locked=trade_lock)
+
+        # Even asked to release balls it does not hold, a session only clears its own stamp
+        await release(first, instance_ids[0][:3] + instance_ids[1][:2])
+
+        locked = await _locked(instance_ids[0][:3] + instance_ids[1][:2])
+        assert [locked[pk] for pk in instance_ids[0][:2]] == [None, None]
+        assert locked[instance_ids[0][2]] == trade_lock
+        assert all(locked[pk] == second['reserved_at'] for pk in instance_ids[1][:2])
+
+    run(test)
+
+
+def test_reservations_expire_after_the_lock_duration():
+    async def test(players, instance_ids):
+        fresh, expired = instance_ids[0][:2]
+        now = timezone.now()
+        await BallInstance.filter(id=fresh).update(locked=now - LOCK_DURATION + timedelta(minutes=1))
+        await BallInstance.filter(id=expired).update(locked=now - LOCK_DURATION - timedelta(minutes=1))
+
+        session = _session(players[0])
+        assert await _add(session, [fresh, expired]) == {expired}
+        assert (await _locked([expired]))[expired] == session['reserved_at']
+
+        # A session lost to a restart: its stamp expires and another session can take the balls
+        await BallInstance.filter(id=expired).update(locked=now - LOCK_DURATION - timedelta(seconds=1))
+        assert await _add(_session(players[0]), [expired]) == {expired}
+        with pytest.raises(CraftRejected):
+            await _craft(session, [expired])
+
+    run(test)
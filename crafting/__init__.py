@@ -1,10 +1,19 @@
+import logging
+import time
 from typing import TYPE_CHECKING
 
-from .cog import Craft
-
 if TYPE_CHECKING:
     from ballsdex.core.bot import BallsDexBot
 
+log = logging.getLogger(__name__)
+
 
 async def setup(bot: "BallsDexBot"):
+    # Imported here so importing the package stays cheap; the catalog is built after the cog loaded
+    start = time.perf_counter()
+    from . import metrics
+    from .cog import Craft
+
     await bot.add_cog(Craft(bot))
+    metrics.startup_seconds["cog_load"] = time.perf_counter() - start
+    log.info(f"Crafting cog loaded in {metrics.startup_seconds['cog_load'] * 1000:.0f}ms")
@@ -0,0 +1,156 @@
+"""
+Admission control for crafting interactions.
+
+Every interaction takes a token from its user's and its guild's bucket before doing
+anything else; an empty bucket rejects it without touching the database. DB-heavy
+callbacks (`@heavy`) also wait for a slot in a global concurrency limit and are turned
+away if none frees up quickly. Limits are read from the bot settings:
+
+    crafting_user_rate / crafting_user_burst      tokens per second / bucket size per user
+    crafting_guild_rate / crafting_guild_burst    same per guild
+    crafting_max_concurrent                       DB-heavy callbacks running at once
+    crafting_admission_wait                       seconds to wait for a slot
+"""
+import asyncio
+import functools
+import time
+from typing import Dict, Optional
+
+import discord
+
+from ballsdex.settings import settings
+
+from . import metrics
+
+USER_RATE = 1.0
+USER_BURST = 5
+GUILD_RATE = 10.0
+GUILD_BURST = 30
+MAX_CONCURRENT = 10
+ADMISSION_WAIT = 1.0
+MAX_BUCKETS = 10_000
+
+BUSY_MESSAGE = "🚦 Crafting is very busy right now, please try again in a few seconds."
+
+admissions = metrics.Counter(
+    "crafting_admission_total", "Crafting interactions admitted or rejected, by limit", ("scope", "outcome")
+)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def retry_after(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated_at) * self.rate >= self.burst
+
+
+class _Limiter:
+    def __init__(self, scope: str, rate_setting: str, rate: float, burst_setting: str, burst: int):
+        self.scope = scope
+        self.rate_setting = rate_setting
+        self.default_rate = rate
+        self.burst_setting = burst_setting
+        self.default_burst = burst
+        self.buckets: Dict[int, TokenBucket] = {}
+
+    def bucket(self, key: int, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_BUCKETS:
+                # Full buckets carry no state, a new one would be identical
+                for stale in [k for k, b in self.buckets.items() if b.is_full(now)]:
+                    del self.buckets[stale]
+            bucket = self.buckets[key] = TokenBucket(
+                getattr(settings, self.rate_setting, self.default_rate),
+                getattr(settings, self.burst_setting, self.default_burst),
+            )
+        return bucket
+
+
+users = _Limiter("user", "crafting_user_rate", USER_RATE, "crafting_user_burst", USER_BURST)
+guilds = _Limiter("guild", "crafting_guild_rate", GUILD_RATE, "crafting_guild_burst", GUILD_BURST)
+
+
+def admit(interaction: discord.Interaction) -> float:
+    """
+    Take a token for the interaction's user and guild. Returns 0 if admitted, else
+    the seconds to wait; a rejected interaction does not consume any token.
+    """
+    now = time.monotonic()
+    checked = [(users, users.bucket(interaction.user.id, now))]
+    if interaction.guild_id is not None:
+        checked.append((guilds, guilds.bucket(interaction.guild_id, now)))
+
+    for limiter, bucket in checked:
+        retry_after = bucket.retry_after(now)
+        if retry_after:
+            admissions.inc(limiter.scope, "rejected")
+            return retry_after
+    for limiter, bucket in checked:
+        bucket.take()
+        admissions.inc(limiter.scope, "admitted")
+    return 0.0
+
+
+_semaphore: Optional[asyncio.Semaphore] = None
+_in_flight = 0
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(getattr(settings, "crafting_max_concurrent", MAX_CONCURRENT))
+    return _semaphore
+
+
+heavy_in_flight = metrics.Gauge(
+    "crafting_heavy_in_flight", "DB-heavy crafting callbacks currently running", lambda: _in_flight
+)
+
+
+def heavy(func):
+    """
+    Run an interaction callback (interaction as second argument) inside the global
+    concurrency limit, answering `BUSY_MESSAGE` if no slot frees up in time.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        global _in_flight
+        interaction: discord.Interaction = args[1]
+        semaphore = _get_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), getattr(settings, "crafting_admission_wait", ADMISSION_WAIT))
+        except asyncio.TimeoutError:
+            admissions.inc("concurrency", "rejected")
+            if not interaction.response.is_done():
+                await interaction.response.send_message(BUSY_MESSAGE, ephemeral=True)
+            else:
+                await interaction.followup.send(BUSY_MESSAGE, ephemeral=True)
+            return
+        admissions.inc("concurrency", "admitted")
+        _in_flight += 1
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _in_flight -= 1
+            semaphore.release()
+
+    return wrapper
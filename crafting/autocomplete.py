@@ -0,0 +1,135 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import discord
+from discord import app_commands
+
+from ballsdex.core.models import BallInstance, balls
+
+from . import metrics
+from .catalog import get_catalog, wait_ready
+from .compiled import recipe_deficit, still_needs
+from .session_manager import crafting_sessions
+
+INDEX_TTL = 30
+MAX_INDEXES = 500  # players whose index is kept, least recently used dropped first
+MAX_CHOICES = 25
+READY_WAIT = 1.0  # of the 3 seconds autocomplete has to answer
+
+# (pk, ball_id, attack_bonus, health_bonus)
+IndexRow = Tuple[int, int, int, int]
+
+
+class _PlayerIndex:
+    def __init__(self, special_id: Optional[int], catalog_fingerprint: int, rows: List[IndexRow]):
+        self.special_id = special_id
+        self.catalog_fingerprint = catalog_fingerprint
+        self.rows = rows
+        self.expires_at = time.monotonic() + INDEX_TTL
+        self.ranked: Optional[List[Tuple[IndexRow, str]]] = None
+
+
+_player_indexes: "OrderedDict[int, _PlayerIndex]" = OrderedDict()
+
+
+def invalidate_player_index(user_id: int, reload: bool = False):
+    """
+    Called whenever a crafting session changes. The ranking depends on the session
+    content so it is always dropped; the instance rows are only reloaded if `reload`
+    (instances were created or deleted).
+    """
+    index = _player_indexes.get(user_id)
+    if index is None:
+        return
+    if reload:
+        del _player_indexes[user_id]
+    else:
+        index.ranked = None
+
+
+async def _get_index(user_id: int, special_id: Optional[int]) -> _PlayerIndex:
+    catalog = await get_catalog()
+    index = _player_indexes.get(user_id)
+    if (
+        index is not None
+        and index.special_id == special_id
+        and index.catalog_fingerprint == catalog.fingerprint
+        and index.expires_at > time.monotonic()
+    ):
+        _player_indexes.move_to_end(user_id)
+        return index
+
+    query = BallInstance.filter(player__discord_id=user_id, ball_id__in=catalog.relevant_ball_ids)
+    if special_id is None:
+        query = query.filter(special_id__isnull=True)
+    else:
+        query = query.filter(special_id=special_id)
+    rows = await query.values_list("id", "ball_id", "attack_bonus", "health_bonus")
+    index = _PlayerIndex(special_id, catalog.fingerprint, rows)
+    _player_indexes[user_id] = index
+    _player_indexes.move_to_end(user_id)
+    while len(_player_indexes) > MAX_INDEXES:
+        _player_indexes.popitem(last=False)
+    return index
+
+
+async def _rank(index: _PlayerIndex, session_instances: List[int]) -> List[Tuple[IndexRow, str]]:
+    """
+    Order the player's instances by how close they bring a recipe to completion:
+    balls filling a requirement of the nearest recipe first, worst stats first.
+    """
+    catalog = await get_catalog()
+    in_session = set(session_instances)
+    counts: Dict[int, int] = {}
+    for row in index.rows:
+        if row[0] in in_session:
+            counts[row[1]] = counts.get(row[1], 0) + 1
+
+    scores: Dict[int, int] = {}
+    for ball_id in {row[1] for row in index.rows}:
+        best = None
+        for recipe_id in catalog.ball_index.get(ball_id, ()):
+            recipe = catalog.recipes[recipe_id]
+            if still_needs(recipe, counts, ball_id):
+                deficit = recipe_deficit(recipe, counts)
+                if best is None or deficit < best:
+                    best = deficit
+        scores[ball_id] = best if best is not None else 1_000_000
+
+    ranked = []
+    for row in sorted(
+        (row for row in index.rows if row[0] not in in_session),
+        key=lambda row: (scores[row[1]], row[2] + row[3]),
+    ):
+        ball = balls.get(row[1])
+        country = ball.country if ball else f"Ball {row[1]}"
+        ranked.append((row, f"#{row[0]:0X} {country} ATK:{row[2]:+d}% HP:{row[3]:+d}%"))
+    return ranked
+
+
+async def ingredient_autocomplete(
+    interaction: discord.Interaction, current: str
+) -> List[app_commands.Choice[str]]:
+    """Suggest only instances usable in a recipe, ranked by what near-miss recipes still need."""
+    session = crafting_sessions.get(interaction.user.id)
+    if not session:
+        return []
+    if not await wait_ready(READY_WAIT):
+        # Offer nothing until the catalog is built
+        metrics.catalog_not_ready.inc("autocomplete")
+        return []
+    special = session['special']
+    index = await _get_index(interaction.user.id, special.pk if special else None)
+    if index.ranked is None:
+        index.ranked = await _rank(index, session['ingredient_instances'])
+
+    current = current.lower().lstrip("#")
+    choices = []
+    for row, name in index.ranked:
+        if current and current not in name.lower():
+            continue
+        choices.append(app_commands.Choice(name=name, value=str(row[0])))
+        if len(choices) >= MAX_CHOICES:
+            break
+    return choices
@@ -0,0 +1,104 @@
+"""
+Card image of the crafted ball, attached to the craft result.
+
+BallsDex's `draw_card` (Pillow) runs in a small dedicated thread pool, like BallsDex
+runs it in an executor for `/balls info`: Pillow releases the GIL while it decodes,
+resizes and encodes, and the card reads the bot's ball and special caches, which a
+worker process would not have.
+
+The result message is sent right away and edited once the card is rendered. Cards are
+not cached: `draw_card` draws the random ATK/HP bonuses into the image, so every crafted
+instance has its own card and is shown once.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional, Tuple
+
+import discord
+
+from ballsdex.settings import settings
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+RENDER_THREADS = 2
+RENDER_TIMEOUT = 10.0
+
+renders = metrics.Counter("crafting_card_renders_total", "Crafted ball card images by outcome", ("outcome",))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_background: set = set()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=getattr(settings, "crafting_card_render_threads", RENDER_THREADS),
+            thread_name_prefix="crafting-cards",
+        )
+    return _pool
+
+
+def _render(instance) -> Tuple[bytes, str]:
+    from ballsdex.core.image_generator.image_gen import draw_card
+
+    result = draw_card(instance)
+    # Recent BallsDex versions also return the save() arguments
+    image, save_kwargs = result if isinstance(result, tuple) else (result, {"format": "PNG"})
+    buffer = BytesIO()
+    try:
+        image.save(buffer, **save_kwargs)
+    finally:
+        image.close()
+    return buffer.getvalue(), save_kwargs.get("format", "PNG").lower()
+
+
+def _file(data: bytes, extension: str) -> discord.File:
+    return discord.File(BytesIO(data), filename=f"card.{extension}")
+
+
+async def render_file(instance) -> Optional[discord.File]:
+    """Render the card off the event loop; None if it failed or took too long."""
+    loop = asyncio.get_running_loop()
+    try:
+        data, extension = await asyncio.wait_for(loop.run_in_executor(_executor(), _render, instance), RENDER_TIMEOUT)
+    except asyncio.TimeoutError:
+        renders.inc("timeout")
+        return None
+    except Exception:
+        renders.inc("failed")
+        log.exception(f"Failed to render the card of crafted instance {instance.pk}")
+        return None
+    renders.inc("rendered")
+    return _file(data, extension)
+
+
+def attach_card(interaction: discord.Interaction, embed: discord.Embed, instance):
+    """Render the card in the background and add it to the already sent result message."""
+
+    async def attach():
+        file = await render_file(instance)
+        if file is None:
+            return
+        embed.set_image(url=f"attachment://{file.filename}")
+        try:
+            await interaction.edit_original_response(embed=embed, attachments=[file])
+        except discord.HTTPException as e:
+            log.debug(f"Could not attach the crafted card: {e}")
+
+    task = asyncio.create_task(attach())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def shutdown():
+    global _pool
+    for task in _background:
+        task.cancel()
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
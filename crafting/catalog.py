@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from tortoise.exceptions import OperationalError
+
+from . import metrics
+from .compiled import CompiledRecipe, RecipeCatalog
+from .models import (
+    CraftingGroupOption,
+    CraftingIngredient,
+    CraftingIngredientGroup,
+    CraftingRecipe,
+    CraftingRecipeCompiled,
+)
+from .unit_of_work import related
+
+log = logging.getLogger(__name__)
+
+# Admin panel edits are picked up after at most this many seconds
+CATALOG_TTL = 300
+# How long a command started during warm-up waits for the catalog before using the DB
+READY_WAIT = 2.0
+# Seconds between warm-up attempts while the database is unavailable, doubling up to the max
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+# Seconds before retrying a failed background refresh, the old catalog is used meanwhile
+REFRESH_RETRY = 30
+
+_catalog: Optional[RecipeCatalog] = None
+_loaded_at = 0.0
+_version = 0
+_lock = asyncio.Lock()
+_ready = asyncio.Event()
+_refresh: Optional[asyncio.Task] = None
+
+
+async def load_compiled(version: int = 0) -> Optional[RecipeCatalog]:
+    """
+    The catalog from `craftingrecipe_compiled`, maintained by the admin panel, in one
+    table scan. None when the table is missing or does not cover every recipe.
+    """
+    try:
+        rows = await CraftingRecipeCompiled.all().values_list("recipe_id", "result_id", "requirements")
+        if len(rows) != await CraftingRecipe.all().count():
+            log.warning("craftingrecipe_compiled is out of date, rebuild it from the admin panel")
+            return None
+    except OperationalError as e:
+        log.debug(f"craftingrecipe_compiled unavailable: {e}")
+        return None
+
+    recipes = []
+    for recipe_id, result_id, requirements in rows:
+        if isinstance(requirements, str):
+            requirements = json.loads(requirements)
+        recipes.append(CompiledRecipe(
+            recipe_id,
+            result_id,
+            {int(ball_id): quantity for ball_id, quantity in requirements.get("fixed", {}).items()},
+            [(required, frozenset(options)) for required, options in requirements.get("groups", ())],
+            requirements.get("null_ingredients", 0),
+        ))
+    return RecipeCatalog(recipes, version)
+
+
+async def build_catalog(version: int = 0) -> RecipeCatalog:
+    """Compile every recipe from the four crafting tables, one flat query per table."""
+    recipes: Dict[int, CompiledRecipe] = {}
+    for recipe_id, result_id in await CraftingRecipe.all().values_list("id", "result_id"):
+        recipes[recipe_id] = CompiledRecipe(recipe_id, result_id)
+
+    for recipe_id, ball_id, quantity in await CraftingIngredient.all().values_list(
+        "recipe_id", "ingredient_id", "quantity"
+    ):
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            continue
+        if ball_id is None:
+            recipe.null_ingredients += 1
+        else:
+            recipe.fixed[ball_id] = recipe.fixed.get(ball_id, 0) + quantity
+
+    options: Dict[int, set] = {}
+    for group_id, ball_id in await CraftingGroupOption.all().values_list("group_id", "ball_id"):
+        options.setdefault(group_id, set()).add(ball_id)
+
+    for group_id, recipe_id, required_count in await CraftingIngredientGroup.all().values_list(
+        "id", "recipe_id", "required_count"
+    ):
+        recipe = recipes.get(recipe_id)
+        if recipe is not None:
+            recipe.groups.append((required_count, frozenset(options.get(group_id, ()))))
+
+    return RecipeCatalog(list(recipes.values()), version)
+
+
+async def compile_recipe(recipe: CraftingRecipe) -> CompiledRecipe:
+    """Compile one recipe loaded through the ORM, using its prefetched relations when present."""
+    compiled = CompiledRecipe(recipe.pk, recipe.result_id)
+    for ingredient in await related(recipe.ingredients):
+        if ingredient.ingredient_id is None:
+            compiled.null_ingredients += 1
+        else:
+            compiled.fixed[ingredient.ingredient_id] = compiled.fixed.get(ingredient.ingredient_id, 0) + ingredient.quantity
+    for group in await related(recipe.ingredient_groups):
+        options = await related(group.options)
+        compiled.groups.append((group.required_count, frozenset(option.ball_id for option in options)))
+    return compiled
+
+
+async def _rebuild(max_age: float) -> RecipeCatalog:
+    global _catalog, _loaded_at, _version
+    async with _lock:
+        if _catalog is None or time.monotonic() - _loaded_at >= max_age:
+            _version += 1
+            _catalog = await load_compiled(_version) or await build_catalog(_version)
+            _loaded_at = time.monotonic()
+            _ready.set()
+    return _catalog
+
+
+async def _refresh_in_background():
+    global _loaded_at
+    try:
+        await _rebuild(CATALOG_TTL)
+    except Exception:
+        log.exception(f"Failed to refresh the crafting catalog, keeping the current one for {REFRESH_RETRY}s")
+        _loaded_at = time.monotonic() - CATALOG_TTL + REFRESH_RETRY
+
+
+async def get_catalog() -> RecipeCatalog:
+    """
+    Return the compiled catalog. Only the very first build is waited for: once older than
+    `CATALOG_TTL`, the current catalog is still returned while a background task rebuilds it.
+    """
+    global _refresh
+    if _catalog is None:
+        return await _rebuild(CATALOG_TTL)
+    if time.monotonic() - _loaded_at >= CATALOG_TTL and (
+        _refresh is None or _refresh.done() or _refresh.get_loop() is not asyncio.get_running_loop()
+    ):
+        _refresh = asyncio.create_task(_refresh_in_background())
+    return _catalog
+
+
+async def refresh_catalog() -> RecipeCatalog:
+    """Rebuild the catalog now and wait for it."""
+    return await _rebuild(0)
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+async def wait_ready(timeout: float = READY_WAIT) -> bool:
+    """Wait up to `timeout` seconds for the first catalog build, return whether it is done."""
+    if _ready.is_set():
+        return True
+    try:
+        await asyncio.wait_for(_ready.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+async def warm_up():
+    """
+    Build the catalog in the background after the cog loaded, retrying with backoff until
+    it succeeds: commands fall back to the database and wait for it until then.
+    """
+    start = time.perf_counter()
+    delay = RETRY_DELAY
+    while True:
+        try:
+            catalog = await get_catalog()
+            break
+        except Exception:
+            log.exception(f"Failed to build the crafting catalog, retrying in {delay:.0f}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MAX_RETRY_DELAY)
+    metrics.startup_seconds["catalog_warm_up"] = time.perf_counter() - start
+    log.info(
+        f"Crafting catalog ready: {len(catalog.recipes)} recipe(s) in "
+        f"{metrics.startup_seconds['catalog_warm_up'] * 1000:.0f}ms"
+    )
+
+
+def invalidate_catalog():
+    """Make the next `get_catalog()` start a rebuild."""
+    global _loaded_at
+    _loaded_at = 0.0
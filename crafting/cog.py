@@ -1,53 +1,82 @@
+import asyncio
+import io
+import logging
+from typing import Optional
+
 import discord
-from discord.ext import commands
 from discord import app_commands
-from typing import Optional
-from discord.ui import Button, View
-from typing import TYPE_CHECKING
-import random
-from typing import Dict, List, Optional
- 
+from discord.ext import commands
+
 from .models import CraftingRecipe
-from .models import CraftingIngredient
-from .models import CraftingIngredientGroup
-from .models import CraftingGroupOption
 
 from ballsdex.core.utils.transformers import BallEnabledTransform
 from ballsdex.core.utils.transformers import BallInstanceTransform
-from ballsdex.core.utils.transformers import SpecialEnabledTransform, TradeCommandType
-from ballsdex.core.bot import BallsDexBot
+from ballsdex.core.utils.transformers import SpecialEnabledTransform
 from ballsdex.settings import settings
 
-if TYPE_CHECKING:
-    from ballsdex.core.bot import BallsDexBot
-
-from ballsdex.core.models import (
-    Ball,
-    BallInstance,
-    BlacklistedGuild,
-    BlacklistedID,
-    GuildConfig,
-    Player,
-    Trade,
-    TradeObject,
-    balls,
-    specials,
-)
+from ballsdex.core.models import Player
 from .logic import (
-    find_matching_recipes, 
-    determine_ingredient_usage, 
-    can_craft_recipe, 
+    check_ingredient,
+    load_bulk_candidates,
+    parse_instance_ids,
+    LOCKED_MESSAGE,
+    MAX_BULK_ADD,
 )
-from .crafting_views import CraftingView, RecipeSelect
 from .session_manager import crafting_sessions
+from .unit_of_work import RECIPE_PREFETCH, remember_instances, unit_of_work
+from .autocomplete import ingredient_autocomplete, invalidate_player_index
+from . import cards, matching, metrics
+from .admission import admit, heavy
+from .catalog import warm_up
+from .notifications import notifier
+from .reservations import release, reserve
+from .craft_log import craft_log
+from .profiling import MAX_PROFILE_SECONDS, profile, watchdog
+
+log = logging.getLogger(__name__)
 
 class Craft(commands.GroupCog):
     def __init__(self, bot):
         self.bot = bot
         self.settings = settings
-        
+
+    async def cog_load(self):
+        craft_log.start()
+        await metrics.setup()
+        watchdog.start()
+        # Nothing below blocks the load, commands arriving meanwhile wait briefly or use the database
+        self._warm_up = asyncio.create_task(self._start_background())
+
+    async def _start_background(self):
+        await warm_up()
+        await notifier.start(self.bot)
+
+    async def cog_unload(self):
+        self._warm_up.cancel()
+        # Write crafting history that is still buffered before the cog goes away
+        await craft_log.stop()
+        await notifier.stop()
+        try:
+            for session in list(crafting_sessions.values()):
+                await release(session)
+        except Exception:
+            log.exception("Failed to release crafting reservations, they expire in 30 minutes")
+        await metrics.shutdown()
+        watchdog.stop()
+        matching.shutdown()
+        cards.shutdown()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Rate limits are checked before anything touches the database
+        retry_after = admit(interaction)
+        if retry_after:
+            raise app_commands.CommandOnCooldown(app_commands.Cooldown(1, retry_after), retry_after)
+        return True
+
+    admin = app_commands.Group(name="admin", description="Crafting diagnostics for the bot owners")
         
     @app_commands.command(name="begin", description="Start a crafting session.")
+    @unit_of_work
     async def craft_begin(self, interaction: discord.Interaction, special: Optional[SpecialEnabledTransform] = None):
         await interaction.response.defer()
         
@@ -66,60 +95,115 @@ class Craft(commands.GroupCog):
             'ingredient_instances': [],
             'special': special,
             'started_at': discord.utils.utcnow(),
+            'reserved_at': None,
             'message': None
         }
+        invalidate_player_index(user_id)
 
         await update_crafting_display(interaction, user_id, is_new=True)
 
-    @app_commands.command(name="add", description="Add a countryball to crafting session")
-    async def craft_add(self, interaction: discord.Interaction, countryball: BallInstanceTransform):
+    @app_commands.command(name="add", description="Add countryballs to crafting session")
+    @app_commands.describe(
+        countryball="A single countryball to add",
+        ids="Several countryball IDs separated by commas or spaces (e.g. 1A2B, 1A2C)",
+        duplicates_of="Add all your duplicates of this countryball (your best copy is kept)",
+        worst="Used with duplicates_of: add this many of your worst-stat copies instead",
+    )
+    @app_commands.autocomplete(countryball=ingredient_autocomplete)
+    @heavy
+    @unit_of_work
+    async def craft_add(
+        self,
+        interaction: discord.Interaction,
+        countryball: Optional[BallInstanceTransform] = None,
+        ids: Optional[str] = None,
+        duplicates_of: Optional[BallEnabledTransform] = None,
+        worst: Optional[app_commands.Range[int, 1, MAX_BULK_ADD]] = None,
+    ):
         await interaction.response.defer(ephemeral=True)
         user_id = interaction.user.id
 
-        # Inside /craft add command, after fetching ball_instance
-        await countryball.fetch_related("ball", "special")
-        
-        # Check if ball is involved in a trade
-        # Reject if ball is involved in a trade, even if unconfirmed
-        if await countryball.is_locked():
-            return await interaction.followup.send(
-                f"❌ This countryball is currently reserved in a trade and can’t be used for crafting.",
-                ephemeral=True
-            )
-            
         if user_id not in crafting_sessions:
             return await interaction.followup.send("❌ Start a crafting session first with `/craft begin`.", ephemeral=True)
 
         session = crafting_sessions[user_id]
-        player = session['player']
-
-        if countryball.player_id != player.pk:
-            return await interaction.followup.send("❌ You don't own this countryball!", ephemeral=True)
 
-        if session['special'] and countryball.special_id != session['special'].pk:
+        if sum(x is not None for x in (countryball, ids, duplicates_of)) != 1:
             return await interaction.followup.send(
-                f"❌ This ball isn't the right special ({session['special'].name})!", ephemeral=True)
-
-        if not session['special'] and countryball.special_id is not None:
-            return await interaction.followup.send("❌ No specials allowed in this session!", ephemeral=True)
+                "❌ Give exactly one of `countryball`, `ids` or `duplicates_of`.", ephemeral=True)
 
-        if countryball.pk in session['ingredient_instances']:
-            return await interaction.followup.send(f"❌ Already added #{countryball.pk}!", ephemeral=True)
+        if countryball is not None:
+            # Inside /craft add command, after fetching ball_instance
+            await countryball.fetch_related("ball", "special")
+            candidates = [countryball]
+        elif ids is not None:
+            try:
+                instance_ids = parse_instance_ids(ids)
+            except ValueError as e:
+                return await interaction.followup.send(f"❌ {e}.", ephemeral=True)
+            if len(instance_ids) > MAX_BULK_ADD:
+                return await interaction.followup.send(
+                    f"❌ You can add at most {MAX_BULK_ADD} countryballs at once.", ephemeral=True)
+            candidates = await load_bulk_candidates(session, instance_ids=instance_ids)
+            found = {c.pk for c in candidates}
+            missing = [i for i in instance_ids if i not in found]
+            if missing:
+                return await interaction.followup.send(
+                    "❌ Unknown countryball ID(s): " + ", ".join(f"#{i:0X}" for i in missing), ephemeral=True)
+        else:
+            candidates = await load_bulk_candidates(session, ball=duplicates_of, worst=worst)
+            if not candidates:
+                return await interaction.followup.send(
+                    f"❌ You have no spare {duplicates_of.country} that can be added.", ephemeral=True)
+        remember_instances(candidates)
 
-        session['ingredient_instances'].append(countryball.pk) 
+        # Ownership, special, trade lock and duplicate checks all run on the rows loaded above,
+        # then the accepted balls are locked for the session in one statement
+        accepted = []
+        rejected = []
+        for candidate in candidates:
+            reason = check_ingredient(session, candidate)
+            if reason:
+                rejected.append((candidate, reason))
+            else:
+                accepted.append(candidate)
+        reserved = await reserve(session, [candidate.pk for candidate in accepted])
+        added = []
+        for candidate in accepted:
+            if candidate.pk in reserved:
+                session['ingredient_instances'].append(candidate.pk)
+                added.append(candidate)
+            else:
+                # Locked or given away since it was loaded
+                rejected.append((candidate, LOCKED_MESSAGE))
 
-        await interaction.followup.send(
+        if countryball is not None:
+            if rejected:
+                return await interaction.followup.send(f"❌ {rejected[0][1]}", ephemeral=True)
+            await interaction.followup.send(
                 f"Added {countryball.ball.country} #{countryball.pk:0X} to crafting session!",
                 ephemeral=True
             )
-            
-        await update_crafting_display(interaction, user_id)
+        else:
+            lines = [f"Added {len(added)} countryball(s) to crafting session!"]
+            for candidate, reason in rejected[:10]:
+                lines.append(f"❌ {candidate.ball.country} #{candidate.pk:0X}: {reason}")
+            if len(rejected) > 10:
+                lines.append(f"*+{len(rejected) - 10} more rejected*")
+            await interaction.followup.send("\n".join(lines), ephemeral=True)
+
+        if added:
+            invalidate_player_index(user_id)
+            await update_crafting_display(interaction, user_id)
 
     @app_commands.command(name="remove", description="Remove a countryball from crafting session")
+    @heavy
+    @unit_of_work
     async def craft_remove(self, interaction: discord.Interaction, countryball: BallInstanceTransform):
         await interaction.response.defer(ephemeral=True)
         user_id = interaction.user.id
         await countryball.fetch_related("ball", "special") 
+        remember_instances([countryball])
 
         if user_id not in crafting_sessions:
             return await interaction.followup.send("❌ No active crafting session!", ephemeral=True)
@@ -129,6 +213,8 @@ class Craft(commands.GroupCog):
             return await interaction.followup.send(f"❌ Instance #{countryball.pk:0X} not in your session!", ephemeral=True)
 
         session['ingredient_instances'].remove(countryball.pk)
+        await release(session, [countryball.pk])
+        invalidate_player_index(user_id)
         
         await interaction.followup.send(
                 f"Removed {countryball.ball.country} #{countryball.pk:0X} from crafting session!",
@@ -137,24 +223,42 @@ class Craft(commands.GroupCog):
         await update_crafting_display(interaction, user_id)
 
     @app_commands.command(name="clear", description="clear all added ingredients from crafting session")
+    @heavy
+    @unit_of_work
     async def craft_clear(self, interaction: discord.Interaction):
         user_id = interaction.user.id
 
         if user_id not in crafting_sessions:
             return await interaction.response.send_message("❌ No active crafting session!", ephemeral=True)
 
+        await release(crafting_sessions[user_id])
         crafting_sessions[user_id]['ingredient_instances'] = [] 
+        invalidate_player_index(user_id)
         await update_crafting_display(interaction, user_id)
 
+    @app_commands.command(name="notify", description="Get a DM when a catch completes a crafting recipe")
+    @app_commands.describe(enabled="Turn the messages on or off")
+    @unit_of_work
+    async def craft_notify(self, interaction: discord.Interaction, enabled: bool):
+        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        await notifier.set_enabled(player, enabled)
+        if enabled:
+            await interaction.response.send_message(
+                "🔔 You will get a DM when a new catch completes a crafting recipe.", ephemeral=True
+            )
+        else:
+            await interaction.response.send_message("🔕 Recipe notifications turned off.", ephemeral=True)
+
     @app_commands.command(name="recipes", description="show all active crafting recipes")
+    @unit_of_work
     async def craft_recipes(self, interaction: discord.Interaction, countryball: Optional[BallEnabledTransform] = None):
         ball = countryball
         
         if ball:
-            recipes = await CraftingRecipe.filter(result=ball).all()
+            recipes = await CraftingRecipe.filter(result=ball).prefetch_related(*RECIPE_PREFETCH)
             title = f"🔨 Recipes for {ball.country}"
         else:
-            recipes = await CraftingRecipe.all().limit(10)
+            recipes = await CraftingRecipe.all().limit(10).prefetch_related(*RECIPE_PREFETCH)
             title = "🔨 Available Recipes (Top 10)"
 
         if not recipes:
@@ -163,7 +267,6 @@ class Craft(commands.GroupCog):
         embed = discord.Embed(title=title, color=0x0099ff)
 
         for recipe in recipes:
-            await recipe.fetch_related('result', 'ingredients__ingredient', 'ingredient_groups__options__ball')
             desc = []
             for ing in recipe.ingredients:
                 if ing.ingredient:
@@ -177,6 +280,28 @@ class Craft(commands.GroupCog):
 
         await interaction.response.send_message(embed=embed)
 
+    @admin.command(name="profile", description="Sample the crafting code and get a flamegraph file")
+    @app_commands.describe(seconds="How long to sample for")
+    async def craft_admin_profile(
+        self, interaction: discord.Interaction, seconds: app_commands.Range[int, 1, MAX_PROFILE_SECONDS] = 10
+    ):
+        if not await interaction.client.is_owner(interaction.user):
+            return await interaction.response.send_message("❌ Only the bot owners can use this command.", ephemeral=True)
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            profiler = await profile(seconds)
+        except RuntimeError as e:
+            return await interaction.followup.send(f"❌ {e}.", ephemeral=True)
+
+        crafting_samples = profiler.samples - profiler.stacks["[outside crafting]"]
+        await interaction.followup.send(
+            f"{profiler.samples} samples in {seconds}s, {crafting_samples} in crafting code. "
+            "Open the file with speedscope or flamegraph.pl.",
+            file=discord.File(io.BytesIO(profiler.collapsed().encode()), filename="crafting-profile.folded"),
+            ephemeral=True,
+        )
+
 async def update_crafting_display(interaction, user_id, is_new=False):
     from .crafting_utils import update_crafting_display as _update
     await _update(interaction, user_id, is_new)
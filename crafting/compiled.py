@@ -0,0 +1,163 @@
+"""
+Plain-data form of the recipe catalog.
+
+This module must not import discord, tortoise or ballsdex: it is shared with worker
+processes and offline tools that only need the recipe requirements.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+
+@dataclass
+class CompiledRecipe:
+    id: int
+    result_id: int
+    fixed: Dict[int, int] = field(default_factory=dict)  # ball_id -> quantity
+    groups: List[Tuple[int, FrozenSet[int]]] = field(default_factory=list)  # (required_count, option ball_ids)
+    null_ingredients: int = 0  # CraftingIngredient rows without a ball, never satisfiable
+
+    @property
+    def ball_ids(self) -> FrozenSet[int]:
+        ids = set(self.fixed)
+        for _, options in self.groups:
+            ids.update(options)
+        return frozenset(ids)
+
+
+def recipe_deficit(recipe: CompiledRecipe, counts: Mapping[int, int]) -> int:
+    """
+    How many balls are still missing for `recipe` given ball_id counts.
+    0 means craftable, with the same rules as `logic.can_craft_recipe`.
+    """
+    missing = 0
+    for ball_id, quantity in recipe.fixed.items():
+        available = counts.get(ball_id, 0)
+        if available < quantity:
+            missing += quantity - available
+    for required, options in recipe.groups:
+        available = sum(counts.get(ball_id, 0) for ball_id in options)
+        if available < required:
+            missing += required - available
+    return missing
+
+
+def still_needs(recipe: CompiledRecipe, counts: Mapping[int, int], ball_id: int) -> bool:
+    """Whether adding one more `ball_id` would reduce the recipe's deficit."""
+    if counts.get(ball_id, 0) < recipe.fixed.get(ball_id, 0):
+        return True
+    for required, options in recipe.groups:
+        if ball_id in options and sum(counts.get(b, 0) for b in options) < required:
+            return True
+    return False
+
+
+class RecipeCatalog:
+    """All compiled recipes plus the ball_id -> recipe ids index."""
+
+    def __init__(self, recipes: List[CompiledRecipe], version: int = 0):
+        self.version = version
+        self.recipes: Dict[int, CompiledRecipe] = {recipe.id: recipe for recipe in recipes}
+        self.ball_index: Dict[int, List[int]] = {}
+        for recipe in recipes:
+            for ball_id in recipe.ball_ids:
+                self.ball_index.setdefault(ball_id, []).append(recipe.id)
+        # Same value for the same recipes, unlike `version` which changes on every reload
+        self.fingerprint = hash(tuple(
+            (
+                recipe.id,
+                recipe.result_id,
+                tuple(sorted(recipe.fixed.items())),
+                tuple(sorted((required, tuple(sorted(options))) for required, options in recipe.groups)),
+                recipe.null_ingredients,
+            )
+            for recipe in sorted(recipes, key=lambda recipe: recipe.id)
+        ))
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    @property
+    def relevant_ball_ids(self) -> List[int]:
+        """Ball ids used by at least one recipe; nothing else can ever be crafted with."""
+        return list(self.ball_index)
+
+    def recipes_touching(self, ball_ids) -> List[CompiledRecipe]:
+        """Recipes that use at least one of `ball_ids`, each listed once."""
+        seen = set()
+        recipes = []
+        for ball_id in ball_ids:
+            for recipe_id in self.ball_index.get(ball_id, ()):
+                if recipe_id not in seen:
+                    seen.add(recipe_id)
+                    recipes.append(self.recipes[recipe_id])
+        return recipes
+
+
+def match_recipes(catalog: RecipeCatalog, counts: Mapping[int, int]) -> List[int]:
+    """Ids of the recipes craftable with ball_id `counts`, in catalog order."""
+    craftable = {recipe.id for recipe in catalog.recipes_touching(counts) if recipe_deficit(recipe, counts) == 0}
+    return [recipe_id for recipe_id in catalog.recipes if recipe_id in craftable]
+
+
+def match_cost(catalog: RecipeCatalog, counts: Mapping[int, int]) -> int:
+    """Rough cost of `match_recipes`: candidate recipes times session size."""
+    candidates = sum(len(catalog.ball_index.get(ball_id, ())) for ball_id in counts)
+    return candidates * sum(counts.values())
+
+
+# (instance_id, ball_id, attack_bonus + health_bonus), in session order
+InstanceRow = Tuple[int, int, int]
+
+
+def assign_ingredients(recipe: CompiledRecipe, instances: Sequence[InstanceRow]) -> List[int]:
+    """
+    Pick the instances to consume for `recipe`, worst stats first: fixed ingredients,
+    then each group from its most abundant options. Empty if a group cannot be filled.
+    """
+    by_ball: Dict[int, List[InstanceRow]] = {}
+    for row in instances:
+        by_ball.setdefault(row[1], []).append(row)
+    for rows in by_ball.values():
+        rows.sort(key=lambda row: row[2])
+
+    used = []
+    for ball_id, quantity in recipe.fixed.items():
+        rows = by_ball.get(ball_id, [])
+        if len(rows) >= quantity:
+            used += [row[0] for row in rows[:quantity]]
+            del rows[:quantity]
+
+    for required, options in recipe.groups:
+        needed = required
+        available = sorted(
+            (ball_id for ball_id in options if by_ball.get(ball_id)),
+            key=lambda ball_id: (-len(by_ball[ball_id]), ball_id),
+        )
+        for ball_id in available:
+            if needed <= 0:
+                break
+            rows = by_ball[ball_id]
+            take = min(needed, len(rows))
+            used += [row[0] for row in rows[:take]]
+            del rows[:take]
+            needed -= take
+        if needed > 0:
+            return []
+    return used
+
+
+# ---- worker processes ----
+
+# Set once per worker process by `init_worker`, so calls only send the session counts
+_worker_catalog: Optional[RecipeCatalog] = None
+
+
+def init_worker(catalog: RecipeCatalog):
+    global _worker_catalog
+    _worker_catalog = catalog
+
+
+def worker_match(fingerprint: int, counts: Mapping[int, int]) -> List[int]:
+    if _worker_catalog is None or _worker_catalog.fingerprint != fingerprint:
+        raise LookupError(f"Worker has no catalog {fingerprint}")
+    return match_recipes(_worker_catalog, counts)
@@ -0,0 +1,193 @@
+"""
+Group commit for the writes of a craft.
+
+`execute_craft` hands the consumed instance ids and the unsaved result to `submit()`.
+Crafts arriving within `crafting_batch_window` seconds are written together in one
+transaction:
+
+1. one SELECT ... FOR UPDATE of every consumed row, checking each craft still holds its
+   ingredients (owner, special and the session's reservation, see `reservations`)
+2. one DELETE of their trade history rows and one DELETE of the instances, for all the
+   valid crafts at once
+3. one multi-row INSERT of the results (ids taken from the sequence beforehand on
+   PostgreSQL so they are known without one round trip per row)
+
+A craft whose ingredients are no longer held fails alone with `CraftRejected`; crafts
+sharing an instance with an earlier craft of the batch wait for the next batch. If the
+shared transaction fails, each craft of the batch is retried in its own transaction, so
+a craft is always applied entirely or not at all.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from tortoise.transactions import in_transaction
+
+from ballsdex.core.models import BallInstance, TradeObject
+from ballsdex.settings import settings
+
+from . import metrics
+from .notifications import notifier
+from .reservations import holds
+
+log = logging.getLogger(__name__)
+
+BATCH_WINDOW = 0.005  # seconds
+MAX_BATCH = 100
+
+batch_sizes = metrics.Histogram(
+    "crafting_craft_batch_size", "Crafts written per shared transaction", buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+
+
+class CraftRejected(Exception):
+    """Some ingredients are no longer owned, of the right special or reserved by the session."""
+
+
+@dataclass
+class _Craft:
+    session: dict
+    instance_ids: List[int]
+    result: BallInstance
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+async def _allocate_ids(connection, count: int) -> Optional[List[int]]:
+    """Next `count` ids of the ballinstance sequence, None where this is not available."""
+    if connection.capabilities.dialect != "postgres":
+        return None
+    rows = await connection.execute_query_dict(
+        "SELECT nextval(pg_get_serial_sequence($1, 'id')) AS id FROM generate_series(1, $2)",
+        [BallInstance._meta.db_table, count],
+    )
+    return [row["id"] for row in rows]
+
+
+async def _insert_results(connection, results: List[BallInstance]):
+    """
+    Insert the crafted instances without sending post_save (notified after the commit):
+    in one executemany on PostgreSQL with preallocated ids, one INSERT each elsewhere.
+
+    The only place relying on Tortoise internals, written against Tortoise 1.1: re-run
+    benchmarks/test_craft_executor.py (with a PostgreSQL URL for the bulk path) after an
+    ORM upgrade. `bulk_create` sends the pks it is given only when `_custom_generated_pk`
+    is set, and neither it nor the executor's `execute_insert` sets `_saved_in_db`, which
+    `save()` and `delete()` rely on.
+    """
+    ids = await _allocate_ids(connection, len(results))
+    if ids is None:
+        executor = connection.executor_class(model=BallInstance, db=connection)
+        for result in results:
+            await executor.execute_insert(result)
+            result._saved_in_db = True
+        return
+    for result, pk in zip(results, ids):
+        result.pk = pk
+        result._custom_generated_pk = True
+    await BallInstance.bulk_create(results, using_db=connection)
+    for result in results:
+        result._saved_in_db = True
+        result._custom_generated_pk = False
+
+
+async def _write(crafts: List[_Craft]) -> List[Tuple[_Craft, Optional[Exception]]]:
+    """Apply `crafts` in one transaction. Returns each craft with its error, None if applied."""
+    outcomes: List[Tuple[_Craft, Optional[Exception]]] = []
+    async with in_transaction() as connection:
+        all_ids = [pk for craft in crafts for pk in craft.instance_ids]
+        rows = {
+            row[0]: row
+            for row in await BallInstance.filter(id__in=all_ids)
+            .select_for_update()
+            .using_db(connection)
+            .values_list("id", "player_id", "special_id", "locked")
+        }
+        valid = []
+        for craft in crafts:
+            if holds(craft.session, [rows.get(pk) for pk in craft.instance_ids]):
+                valid.append(craft)
+            else:
+                outcomes.append((craft, CraftRejected()))
+        if not valid:
+            return outcomes
+
+        consumed = [pk for craft in valid for pk in craft.instance_ids]
+        await TradeObject.filter(ballinstance_id__in=consumed).using_db(connection).delete()
+        deleted = await BallInstance.filter(id__in=consumed).using_db(connection).delete()
+        if deleted != len(consumed):
+            # The rows are locked, this only happens if the check above is wrong: roll back
+            raise RuntimeError(f"Deleted {deleted} instances instead of {len(consumed)}")
+        await _insert_results(connection, [craft.result for craft in valid])
+    return outcomes + [(craft, None) for craft in valid]
+
+
+def _notify(results: List[BallInstance]):
+    """Committed results: the consumed balls no longer count towards recipe notifications."""
+    try:
+        for result in results:
+            notifier.forget_player(result.player_id)
+        for result in results:
+            notifier.on_catch(result)
+    except Exception:
+        log.exception("Failed to check recipe notifications of crafted balls")
+
+
+class CraftExecutor:
+    def __init__(self):
+        self.queue: List[_Craft] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, session: dict, instance_ids: List[int], result: BallInstance) -> BallInstance:
+        """
+        Delete `instance_ids` and save `result` atomically, batched with concurrent crafts.
+        Raises `CraftRejected` if the session no longer holds every instance.
+        """
+        craft = _Craft(session, list(instance_ids), result)
+        self.queue.append(craft)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await craft.future
+
+    async def _run(self):
+        while self.queue:
+            window = getattr(settings, "crafting_batch_window", BATCH_WINDOW)
+            if window and len(self.queue) < MAX_BATCH:
+                await asyncio.sleep(window)
+            batch, deferred, taken = [], [], set()
+            for craft in self.queue[:MAX_BATCH]:
+                if taken.isdisjoint(craft.instance_ids):
+                    taken.update(craft.instance_ids)
+                    batch.append(craft)
+                else:
+                    deferred.append(craft)
+            self.queue = deferred + self.queue[MAX_BATCH:]
+            await self._apply(batch)
+
+    async def _apply(self, batch: List[_Craft]):
+        batch_sizes.observe(len(batch))
+        try:
+            outcomes = await _write(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                outcomes = [(batch[0], e)]
+            else:
+                log.warning(f"Shared craft transaction of {len(batch)} crafts failed ({e!r}), retrying them one by one")
+                outcomes = []
+                for craft in batch:
+                    try:
+                        outcomes += await _write([craft])
+                    except Exception as error:
+                        outcomes.append((craft, error))
+        for craft, error in outcomes:
+            if craft.future.done():
+                continue
+            if error is None:
+                craft.future.set_result(craft.result)
+            else:
+                craft.future.set_exception(error)
+        # Outside the write and its retries: a committed craft must not be reported as failed
+        _notify([craft.result for craft, error in outcomes if error is None])
+
+
+craft_executor = CraftExecutor()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from .models import CraftingLog
+from .rollups import apply_rollups
+
+log = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0  # seconds
+BATCH_SIZE = 100
+MAX_PENDING = 10_000  # rows kept in memory while the DB is unreachable
+
+
+class CraftLogWriter:
+    """
+    Write-behind queue for `CraftingLog` rows.
+
+    The craft path only appends to an in-memory buffer; a background task writes the
+    rows with `bulk_create`, and their daily rollups in the same transaction, every
+    `FLUSH_INTERVAL` seconds or as soon as `BATCH_SIZE` rows are pending. Call `stop()`
+    on unload to write what is left.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, batch_size: int = BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: List[CraftingLog] = []
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def record(self, *, player, recipe, result_instance, special, consumed, started_at: float):
+        """Queue a log row for a committed craft. `started_at` is a `time.monotonic()` value."""
+        self._pending.append(
+            CraftingLog(
+                player_id=player.pk,
+                recipe_id=recipe.pk,
+                result_ball_id=result_instance.ball_id,
+                result_instance_id=result_instance.pk,
+                result_attack_bonus=result_instance.attack_bonus,
+                result_health_bonus=result_instance.health_bonus,
+                special_id=special.pk if special else None,
+                consumed=[
+                    {
+                        "id": instance.pk,
+                        "ball_id": instance.ball_id,
+                        "attack_bonus": instance.attack_bonus,
+                        "health_bonus": instance.health_bonus,
+                    }
+                    for instance in consumed
+                ],
+                crafted_at=timezone.now(),
+                duration_ms=int((time.monotonic() - started_at) * 1000),
+            )
+        )
+        if len(self._pending) > MAX_PENDING:
+            dropped = len(self._pending) - MAX_PENDING
+            del self._pending[:dropped]
+            log.warning(f"Dropped {dropped} unwritten crafting log rows")
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write every pending row now. Returns how many rows were written."""
+        async with self._flush_lock:
+            written = 0
+            while self._pending:
+                rows = self._pending[: self.batch_size]
+                del self._pending[: self.batch_size]
+                try:
+                    # Rollups are only ever incremented along with their log rows
+                    async with in_transaction() as connection:
+                        await CraftingLog.bulk_create(rows, using_db=connection)
+                        await apply_rollups(rows, connection)
+                except asyncio.CancelledError:
+                    self._pending[:0] = rows
+                    raise
+                except Exception as e:
+                    log.error(f"Failed to write {len(rows)} crafting log rows: {e}")
+                    self._pending[:0] = rows  # retry on the next flush
+                    break
+                written += len(rows)
+            return written
+
+    async def stop(self):
+        """Stop the background task and write the remaining rows."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+craft_log = CraftLogWriter()
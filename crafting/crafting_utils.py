@@ -1,38 +1,15 @@
 import discord
-from typing import Dict, List, Optional
-import random
+import logging
 
-from .models import CraftingRecipe
-from .models import CraftingIngredient
-from .models import CraftingIngredientGroup                                            
-from .models import CraftingGroupOption
-
-from ballsdex.settings import settings                                       
-from ballsdex.core.utils.transformers import BallEnabledTransform, BallTransform        
-from ballsdex.core.utils.transformers import SpecialEnabledTransform
-from ballsdex.settings import settings                  
-                                
-from ballsdex.core.models import (
-    Ball,
-    BallInstance,
-    BlacklistedGuild,
-    BlacklistedID,
-    GuildConfig,
-    Player,
-    Trade,
-    TradeObject,                                                                            
-    balls,
-    specials,
-)
-from .logic import (
-    find_matching_recipes,
-    determine_ingredient_usage,
-    can_craft_recipe
-)
-
-from .crafting_views import CraftingView 
+from . import metrics
+from .crafting_views import CraftingView
+from .logic import find_matching_recipes
+from .matching import StillComputing
 
 from .session_manager import crafting_sessions
+from .unit_of_work import get_instances
+
+log = logging.getLogger(__name__)
  
 async def update_crafting_display(interaction, user_id, is_new=False):
     """Update the crafting session display using followup (for when we already responded)."""
@@ -42,15 +19,16 @@ async def update_crafting_display(interaction, user_id, is_new=False):
     ball_instances = []
     if session['ingredient_instances']:
         try:
-            ball_instances = await BallInstance.filter(
-                id__in=session['ingredient_instances']
-            ).prefetch_related('ball', 'special').all()
+            ball_instances = await get_instances(session['ingredient_instances'])
         except Exception as e:
-            print(f"Error fetching ball instances: {e}")
+            log.error(f"Error fetching ball instances: {e}")
             return
     
     # Find possible recipes
-    possible_recipes = await find_matching_recipes(session['ingredient_instances'])
+    try:
+        possible_recipes = await find_matching_recipes(session['ingredient_instances'])
+    except StillComputing:
+        possible_recipes = None
     
     embed = discord.Embed(
         title="🔨 Crafting Session",
@@ -70,6 +48,12 @@ async def update_crafting_display(interaction, user_id, is_new=False):
             value="\n".join(results) + (f"\n*+{len(possible_recipes)-5} more*" if len(possible_recipes) > 5 else ""),
             inline=False
         )
+    elif possible_recipes is None:
+        embed.add_field(
+            name="⏳ Can Craft",
+            value="*Still working out what these ingredients can craft...*\nPress 🔨 Craft in a few seconds",
+            inline=False
+        )
     else:
         embed.add_field(
             name="❓ Can Craft",
@@ -128,11 +112,13 @@ async def update_crafting_display(interaction, user_id, is_new=False):
     if is_new:
         message = await interaction.followup.send("Crafting session:", embed=embed, view=view)
         session['message'] = message
+        metrics.embed_edits.inc("new_message")
         return  # skip the rest
         
     try:
         if 'message' in session and session['message']:
             await session['message'].edit(embed=embed, view=view)
+            metrics.embed_edits.inc("sent")
         else:
             # Fallback: try to find the message in recent history
             channel = interaction.channel
@@ -141,6 +127,7 @@ async def update_crafting_display(interaction, user_id, is_new=False):
                     message.embeds and 
                     message.embeds[0].title == "🔨 Crafting Session"):
                     await message.edit(embed=embed, view=view)
+                    metrics.embed_edits.inc("sent")
                     # Store the message reference for future use
                     session['message'] = message
                     break
@@ -148,12 +135,16 @@ async def update_crafting_display(interaction, user_id, is_new=False):
                 # If we can't find the original, send a new message
                 new_message = await interaction.followup.send("Updated crafting session:", embed=embed, view=view)
                 session['message'] = new_message
+                metrics.embed_edits.inc("new_message")
     except Exception as e:
-        print(f"Error updating crafting display: {e}")
+        rate_limited = isinstance(e, discord.HTTPException) and e.status == 429
+        metrics.embed_edits.inc("rate_limited" if rate_limited else "failed")
+        log.warning(f"Error updating crafting display: {e}")
         # If we can't edit the original, send a new message
         try:
             new_message = await interaction.followup.send("Updated crafting session:", embed=embed, view=view)
             session['message'] = new_message
+            metrics.embed_edits.inc("new_message")
         except Exception as e2:
-            print(f"Error sending followup message: {e2}")
+            log.error(f"Error sending followup message: {e2}")
 
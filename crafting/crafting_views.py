@@ -1,31 +1,41 @@
 import discord
+import logging
 import random
-from .models import CraftingRecipe
-from .models import CraftingIngredient
-from .models import CraftingIngredientGroup
-from .models import CraftingGroupOption
+import time
 
 from .logic import (
     find_matching_recipes, 
     determine_ingredient_usage,
-    can_craft_recipe
 )
 
-
-from ballsdex.core.models import (
-    Ball,
-    BallInstance,
-    BlacklistedGuild,
-    BlacklistedID,
-    GuildConfig,
-    Player,
-    Trade,
-    TradeObject,
-    balls,
-    specials,
-)
+from ballsdex.core.models import BallInstance
 from ballsdex.settings import settings 
+from . import cards, metrics
 from .session_manager import crafting_sessions 
+from .unit_of_work import forget_instances, get_instances, unit_of_work
+from .autocomplete import invalidate_player_index
+from .craft_log import craft_log
+from .matching import StillComputing
+from .admission import admit, heavy
+from .craft_executor import CraftRejected, craft_executor
+from .reservations import release
+
+log = logging.getLogger(__name__)
+
+async def check_rate_limit(interaction: discord.Interaction) -> bool:
+    retry_after = admit(interaction)
+    if retry_after:
+        await interaction.response.send_message(
+            f"⏳ You're going too fast, try again <t:{int(time.time() + retry_after) + 1}:R>.", ephemeral=True
+        )
+        return False
+    return True
+
+STILL_COMPUTING = "⏳ Still working out what your ingredients can craft, try again in a few seconds."
+NOT_RESERVED = (
+    "❌ Some of these ingredients were traded, given away or locked since you added them. "
+    "Remove them from the session and try again."
+)
 
 class CraftingView(discord.ui.View):
     def __init__(self, bot, player, session_data):
@@ -43,12 +53,18 @@ class CraftingView(discord.ui.View):
                 ephemeral=True
             )
             return False
-        return True
+        return await check_rate_limit(interaction)
     
     @discord.ui.button(label="🔨 Craft", style=discord.ButtonStyle.success)
+    @heavy
+    @unit_of_work
     async def craft_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         # Check if current ingredients match any recipe
-        possible_recipes = await find_matching_recipes(self.session_data['ingredient_instances'])
+        try:
+            possible_recipes = await find_matching_recipes(self.session_data['ingredient_instances'])
+        except StillComputing:
+            await interaction.response.send_message(STILL_COMPUTING, ephemeral=True)
+            return
         
         if len(self.session_data['ingredient_instances']) == 0:
             await interaction.response.send_message("You haven't added any ingredients yet!", ephemeral=True)
@@ -66,13 +82,20 @@ class CraftingView(discord.ui.View):
             await self.show_recipe_selection(interaction, possible_recipes)
         else:
             await self.execute_craft(interaction, possible_recipes[0])
-        self.stop() 
         
+    async def end_session(self, user_id: int):
+        """Close the session, release the ingredients it still holds and stop the view."""
+        session = crafting_sessions.pop(user_id, None)
+        if session is not None:
+            await release(session)
+        self.stop()
+
     @discord.ui.button(label="❌ Cancel", style=discord.ButtonStyle.danger)
+    @unit_of_work
     async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         user_id = interaction.user.id
-        if user_id in crafting_sessions:
-            del crafting_sessions[user_id]
+        await self.end_session(user_id)
+        invalidate_player_index(user_id)
         
         embed = discord.Embed(
             title="Crafting Cancelled",
@@ -84,7 +107,8 @@ class CraftingView(discord.ui.View):
         
     async def on_timeout(self):
         user_id = self.player.discord_id
-        crafting_sessions.pop(user_id, None)
+        await self.end_session(user_id)
+        invalidate_player_index(user_id)
     
         try:
             # Check if message exists and is still valid
@@ -125,6 +149,7 @@ class CraftingView(discord.ui.View):
         await interaction.response.edit_message(embed=embed, view=view)
     
     async def execute_craft(self, interaction, recipe):
+        started_at = time.monotonic()
         try:
             # Determine which ingredients to use (including group selections)
             ingredients_to_use = await determine_ingredient_usage(
@@ -133,6 +158,7 @@ class CraftingView(discord.ui.View):
             )
     
             if not ingredients_to_use:
+                metrics.crafts.inc("failed", "no_ingredient_usage")
                 await interaction.response.send_message(
                     "Unable to determine ingredient usage. This shouldn't happen!",
                     ephemeral=True
@@ -140,57 +166,51 @@ class CraftingView(discord.ui.View):
                 return
     
             # Get the actual ball instances to use
-            ball_instances_to_delete = []
-            for instance_id in ingredients_to_use:
-                instance = await BallInstance.get(id=instance_id)
-                await instance.fetch_related('ball', 'special')
-                ball_instances_to_delete.append(instance)
-    
-            # Clean up - first remove any lingering trade references, then delete instances
+            ball_instances_to_delete = await get_instances(ingredients_to_use)
             instance_ids_to_delete = [ball.id for ball in ball_instances_to_delete]
+            await recipe.fetch_related("result")
     
+            # Consume them and create the new ball in one transaction, shared with concurrent crafts.
+            # The executor locks the rows and checks they are still owned, of the right special and
+            # reserved by this session (so not in a trade or given away since they were added)
             try:
-                # Remove any trade object references that might be lingering
-                await TradeObject.filter(ballinstance_id__in=instance_ids_to_delete).delete()
-                print(f"Cleaned up trade object references for: {instance_ids_to_delete}")
-            except Exception as e:
-                print(f"Error cleaning up trade objects: {e}")
-                del crafting_sessions[interaction.user.id]
-                await interaction.followup.send(
-                    "Error cleaning up trade references. Crafting session ended for security.",
-                    ephemeral=True
+                crafted_instance = await craft_executor.submit(
+                    self.session_data,
+                    instance_ids_to_delete,
+                    BallInstance(
+                        player=self.player,
+                        ball=recipe.result,
+                        special=self.session_data.get('special'),
+                        health_bonus=random.randint(-settings.max_attack_bonus, settings.max_attack_bonus),
+                        attack_bonus=random.randint(-settings.max_attack_bonus, settings.max_attack_bonus),
+                    ),
                 )
+            except CraftRejected:
+                metrics.crafts.inc("failed", "not_reserved")
+                await interaction.response.send_message(NOT_RESERVED, ephemeral=True)
                 return
-    
-            try:
-                deleted_count = await BallInstance.filter(id__in=instance_ids_to_delete).delete()    
-                if deleted_count != len(instance_ids_to_delete):
-                    print(f"🚨 Mismatch in deletion count: expected {len(instance_ids_to_delete)} but got {deleted_count}")
-                    del crafting_sessions[interaction.user.id]
-                    await interaction.followup.send(
-                        "Not all ingredients were properly consumed. Crafting session ended for security.",
-                        ephemeral=True
-                    )
-                    return
-    
             except Exception as e:
-                print(f"Error deleting ball instances: {e}")
-                del crafting_sessions[interaction.user.id]
-                await interaction.followup.send(
+                log.error(f"Error consuming ball instances: {e}")
+                metrics.crafts.inc("failed", "delete_error")
+                await self.end_session(interaction.user.id)
+                await interaction.response.send_message(
                     "Error consuming ingredients. Crafting session ended for security.",
                     ephemeral=True
                 )
                 return
-    
-            # Create the new ball
-            await recipe.fetch_related("result")
-            crafted_instance = await BallInstance.create(
+            forget_instances(instance_ids_to_delete)
+            invalidate_player_index(interaction.user.id, reload=True)
+
+            craft_log.record(
                 player=self.player,
-                ball=recipe.result,
+                recipe=recipe,
+                result_instance=crafted_instance,
                 special=self.session_data.get('special'),
-                health_bonus=random.randint(-settings.max_attack_bonus, settings.max_attack_bonus),
-                attack_bonus=random.randint(-settings.max_attack_bonus, settings.max_attack_bonus),
+                consumed=ball_instances_to_delete,
+                started_at=started_at,
             )
+            metrics.crafts.inc("succeeded", "")
+            metrics.balls_consumed.inc(amount=len(ball_instances_to_delete))
     
             # Calculate stats
             total_sacrificed_attack = sum(ball.attack_bonus for ball in ball_instances_to_delete)
@@ -243,24 +263,34 @@ class CraftingView(discord.ui.View):
                     inline=False
                 )
     
+            # The craft ends the session: the ingredients it did not use are released
+            leftover = [
+                pk for pk in self.session_data['ingredient_instances'] if pk not in instance_ids_to_delete
+            ]
+            if leftover:
+                embed.add_field(
+                    name="Unused Ingredients",
+                    value=f"{len(leftover)} unused ingredient(s) have been returned to you.",
+                    inline=False
+                )
+
+            # The card is added to the message once it is rendered
             await interaction.response.edit_message(embed=embed, view=None)
+            cards.attach_card(interaction, embed, crafted_instance)
+
+            self.session_data['ingredient_instances'] = leftover
+            await self.end_session(interaction.user.id)
     
-            # Update session memory
-            for instance_id in ingredients_to_use:
-                if instance_id in self.session_data['ingredient_instances']:
-                    self.session_data['ingredient_instances'].remove(instance_id)
-    
-            if not self.session_data['ingredient_instances']:
-                del crafting_sessions[interaction.user.id]
-    
+        except StillComputing:
+            await interaction.response.send_message(STILL_COMPUTING, ephemeral=True)
         except Exception as e:
-            print(f"Unexpected error in execute_craft: {e}")
+            log.exception(f"Unexpected error in execute_craft: {e}")
+            metrics.crafts.inc("failed", "unexpected")
             await interaction.response.send_message(
                 "An unexpected error occurred during crafting. Please try again.",
                 ephemeral=True
             )
-            if interaction.user.id in crafting_sessions:
-                del crafting_sessions[interaction.user.id]         
+            await self.end_session(interaction.user.id)
 
 class RecipeSelect(discord.ui.Select):
     def __init__(self, options, recipes, parent_view, authorized_user_id):
@@ -277,8 +307,10 @@ class RecipeSelect(discord.ui.Select):
                 ephemeral=True
             )
             return False
-        return True
+        return await check_rate_limit(interaction)
     
+    @heavy
+    @unit_of_work(label="recipe_select")
     async def callback(self, interaction):
         recipe_index = int(self.values[0])
         selected_recipe = self.recipes[recipe_index]
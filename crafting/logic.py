@@ -1,66 +1,46 @@
-import discord
-from discord.ext import commands
-from discord import app_commands
-from typing import Optional
-from discord.ui import Button, View
-from typing import TYPE_CHECKING
-import random
+import re
+from datetime import timedelta
 from typing import Dict, List, Optional
 
-from .models import CraftingRecipe
-from .models import CraftingIngredient
-from .models import CraftingIngredientGroup
-from .models import CraftingGroupOption
-from ballsdex.core.utils.transformers import BallTransform
-from ballsdex.core.utils.transformers import BallInstanceTransform
-from ballsdex.core.utils.transformers import SpecialEnabledTransform
-from ballsdex.core.bot import BallsDexBot
-from ballsdex.settings import settings
-
-if TYPE_CHECKING:
-    from ballsdex.core.bot import BallsDexBot
-
-from ballsdex.core.models import (
-    Ball,
-    BallInstance,
-    BlacklistedGuild,
-    BlacklistedID,
-    GuildConfig,
-    Player,
-    Trade,
-    TradeObject,
-    balls,
-    specials,
-)
-
-
-from .session_manager import crafting_sessions
+from tortoise import timezone
+
+from ballsdex.core.models import BallInstance
+
+from . import matching, metrics
+from .catalog import compile_recipe, get_catalog, wait_ready
+from .unit_of_work import get_instances, get_recipes, related
+
 async def find_matching_recipes(ingredient_instance_ids: List[int]) -> List:
     """Find all recipes that can be crafted with the given ingredient instances."""
     if not ingredient_instance_ids:
         return []
     
     # Get the ball instances and their ball types
-    ball_instances = await BallInstance.filter(
-        id__in=ingredient_instance_ids
-    ).prefetch_related('ball').all()
+    ball_instances = await get_instances(ingredient_instance_ids)
     
     # Convert to ball type counts
     ball_counts = {}
     for instance in ball_instances:
-        ball_id = instance.ball.id
+        ball_id = instance.ball_id
         ball_counts[ball_id] = ball_counts.get(ball_id, 0) + 1
     
-    # Get all recipes with their related data
-    all_recipes = await CraftingRecipe.all().prefetch_related(
-        'ingredients__ingredient',
-        'ingredient_groups__options__ball',
-        'result'
-    )
+    if not await wait_ready():
+        # Still warming up after a restart: check every recipe against the database rows
+        metrics.catalog_not_ready.inc("find_matching_recipes")
+        return [recipe for recipe in await get_recipes() if await can_craft_recipe(recipe, ball_counts)]
+
+    # Match against the compiled catalog (in the worker pool for big sessions),
+    # then load only the matching recipes
+    catalog = await get_catalog()
+    start = metrics.now()
+    recipe_ids = await matching.match(catalog, ball_counts)
+    metrics.matcher_duration.observe(metrics.elapsed(start))
+    if metrics.enabled():
+        metrics.matcher_candidates.observe(sum(len(catalog.ball_index.get(ball_id, ())) for ball_id in ball_counts))
     
+    # The catalog can be a few minutes old, check the matches against the current rows
     matching_recipes = []
-    
-    for recipe in all_recipes:
+    for recipe in await get_recipes(recipe_ids):
         if await can_craft_recipe(recipe, ball_counts):
             matching_recipes.append(recipe)
     
@@ -69,7 +49,7 @@ async def find_matching_recipes(ingredient_instance_ids: List[int]) -> List:
 async def can_craft_recipe(recipe, available_ball_counts: Dict[int, int]) -> bool:
     """Check if a recipe can be crafted with available ball counts."""
     # Check individual ingredients
-    recipe_ingredients = await recipe.ingredients.all()
+    recipe_ingredients = await related(recipe.ingredients)
     for ingredient in recipe_ingredients:
         if ingredient.ingredient_id:  # Only check if ingredient is not None
             required_qty = ingredient.quantity
@@ -78,9 +58,9 @@ async def can_craft_recipe(recipe, available_ball_counts: Dict[int, int]) -> boo
                 return False
     
     # Check ingredient groups
-    recipe_groups = await recipe.ingredient_groups.all()
+    recipe_groups = await related(recipe.ingredient_groups)
     for group in recipe_groups:
-        group_options = await group.options.all()
+        group_options = await related(group.options)
         available_from_group = 0
         
         for option in group_options:
@@ -97,66 +77,78 @@ async def determine_ingredient_usage(recipe, ingredient_instance_ids: List[int])
     Returns a list of instance IDs to use.
     """
     # Get the ball instances
-    ball_instances = await BallInstance.filter(
-        id__in=ingredient_instance_ids
-    ).prefetch_related('ball').all()
-    
-    # Group instances by ball type
-    instances_by_ball = {}
-    for instance in ball_instances:
-        ball_id = instance.ball.id
-        if ball_id not in instances_by_ball:
-            instances_by_ball[ball_id] = []
-        instances_by_ball[ball_id].append(instance)
-    
-    # Sort instances within each ball type by stats (use worst stats first to preserve better ones)
-    for ball_id in instances_by_ball:
-        instances_by_ball[ball_id].sort(key=lambda x: x.attack_bonus + x.health_bonus)
-    
-    instances_to_use = []
-    
-    # Use individual ingredients first
-    recipe_ingredients = await recipe.ingredients.all()
-    for ingredient in recipe_ingredients:
-        if ingredient.ingredient_id:
-            ball_id = ingredient.ingredient_id
-            needed = ingredient.quantity
-            
-            if ball_id in instances_by_ball and len(instances_by_ball[ball_id]) >= needed:
-                # Use the required instances
-                for i in range(needed):
-                    instance = instances_by_ball[ball_id].pop(0)
-                    instances_to_use.append(instance.id)
-    
-    # Handle ingredient groups - use a greedy approach
-    recipe_groups = await recipe.ingredient_groups.all()
-    for group in recipe_groups:
-        group_options = await group.options.all()
-        needed = group.required_count
-        
-        # Sort options by availability (use most abundant first)
-        available_options = []
-        for option in group_options:
-            ball_id = option.ball_id
-            available_qty = len(instances_by_ball.get(ball_id, []))
-            if available_qty > 0:
-                available_options.append((ball_id, available_qty))
-        
-        available_options.sort(key=lambda x: x[1], reverse=True)
-        
-        # Use instances from this group
-        for ball_id, available_qty in available_options:
-            if needed <= 0:
-                break
-            
-            to_use = min(needed, available_qty)
-            for i in range(to_use):
-                instance = instances_by_ball[ball_id].pop(0)
-                instances_to_use.append(instance.id)
-            needed -= to_use
-        
-        # If we couldn't fulfill the group requirement, this shouldn't happen
-        if needed > 0:
-            return []
+    ball_instances = await get_instances(ingredient_instance_ids)
+    rows = [
+        (instance.id, instance.ball_id, instance.attack_bonus + instance.health_bonus)
+        for instance in ball_instances
+    ]
     
-    return instances_to_use
+    # Worst stats first to preserve better ones, groups from their most abundant options
+    return await matching.assign(await compile_recipe(recipe), rows)
+
+
+MAX_BULK_ADD = 50
+
+def parse_instance_ids(text: str) -> List[int]:
+    """Parse instance IDs as shown in the embeds (hex, optional #), separated by commas or spaces."""
+    ids = []
+    for token in re.split(r"[\s,;]+", text.strip()):
+        if not token:
+            continue
+        try:
+            ids.append(int(token.lstrip("#"), 16))
+        except ValueError:
+            raise ValueError(f"`{token}` is not a valid countryball ID")
+    return list(dict.fromkeys(ids))
+
+def is_trade_locked(instance) -> bool:
+    """Same rule as `BallInstance.is_locked()`, but on the already loaded row (no refresh query)."""
+    return instance.locked is not None and instance.locked + timedelta(minutes=30) > timezone.now()
+
+LOCKED_MESSAGE = "This countryball is currently reserved in a trade and can’t be used for crafting."
+
+def check_ingredient(session, instance) -> Optional[str]:
+    """Return why an instance can't be added to the session, or None if it can."""
+    special = session['special']
+    if instance.player_id != session['player'].pk:
+        return "You don't own this countryball!"
+    # Session ingredients are locked by the session itself, check them first
+    if instance.pk in session['ingredient_instances']:
+        return f"Already added #{instance.pk:0X}!"
+    if is_trade_locked(instance):
+        return LOCKED_MESSAGE
+    if special and instance.special_id != special.pk:
+        return f"This ball isn't the right special ({special.name})!"
+    if not special and instance.special_id is not None:
+        return "No specials allowed in this session!"
+    return None
+
+async def load_bulk_candidates(
+    session, instance_ids: Optional[List[int]] = None, ball=None, worst: Optional[int] = None
+) -> List[BallInstance]:
+    """
+    Load the instances targeted by a bulk `/craft add` in a single query.
+
+    Either explicit `instance_ids`, or the player's copies of `ball` matching the session's
+    special: the `worst` worst-stat copies if given, otherwise every copy but the best one.
+    Nothing is validated here, see `check_ingredient`.
+    """
+    if instance_ids is not None:
+        instances = await BallInstance.filter(id__in=instance_ids).prefetch_related('ball', 'special')
+        by_id = {instance.pk: instance for instance in instances}
+        return [by_id[i] for i in instance_ids if i in by_id]
+
+    query = BallInstance.filter(player_id=session['player'].pk, ball_id=ball.pk)
+    if session['special']:
+        query = query.filter(special_id=session['special'].pk)
+    else:
+        query = query.filter(special_id__isnull=True)
+    copies = await query.prefetch_related('ball', 'special')
+    copies.sort(key=lambda x: x.attack_bonus + x.health_bonus)
+
+    if worst is None:
+        copies = copies[:-1]  # keep the best copy
+    copies = [c for c in copies if c.pk not in session['ingredient_instances'] and not is_trade_locked(c)]
+    if worst is not None:
+        copies = copies[:worst]
+    return copies[:MAX_BULK_ADD]
@@ -0,0 +1,167 @@
+"""
+Runs the pure matcher and assigner from `compiled` off the event loop when a call is
+expensive, with a time budget.
+
+Cheap calls run inline. Above `crafting_offload_threshold` (candidate recipes times
+session size) they go to a process pool whose workers receive the compiled catalog
+once, when the pool is created for that catalog content (reloads of an unchanged
+catalog keep the pool); with
+`crafting_worker_processes = 0` a thread pool is used instead. A call still running
+after `crafting_time_budget` seconds raises `StillComputing` and keeps running: the
+next identical call picks up its result.
+"""
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Hashable, List, Mapping, Optional, Sequence
+
+from ballsdex.settings import settings
+
+from . import metrics
+from .compiled import (
+    CompiledRecipe,
+    InstanceRow,
+    RecipeCatalog,
+    assign_ingredients,
+    init_worker,
+    match_cost,
+    match_recipes,
+    worker_match,
+)
+
+log = logging.getLogger(__name__)
+
+OFFLOAD_THRESHOLD = 200_000
+TIME_BUDGET = 2.5  # seconds
+WORKER_PROCESSES = 2
+MAX_PENDING = 256
+
+offloaded = metrics.Counter(
+    "crafting_offloaded_total", "Matching calls run in the worker pool, by outcome", ("function", "outcome")
+)
+
+
+class StillComputing(Exception):
+    """The call went over the time budget; it keeps running in the pool."""
+
+
+_executor: Optional[Executor] = None
+_executor_fingerprint: Optional[int] = None
+_pending: "OrderedDict[Hashable, asyncio.Future]" = OrderedDict()
+
+
+def _process_pool(catalog: RecipeCatalog) -> Optional[Executor]:
+    """Process pool bound to `catalog`, replacing the pool of a catalog with other recipes."""
+    global _executor, _executor_fingerprint
+    if _executor is not None and _executor_fingerprint == catalog.fingerprint:
+        return _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    # spawn: the bot has threads running, forking it is not safe
+    _executor = ProcessPoolExecutor(
+        max_workers=getattr(settings, "crafting_worker_processes", WORKER_PROCESSES),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(catalog,),
+    )
+    _executor_fingerprint = catalog.fingerprint
+    return _executor
+
+
+def _discard_pool(executor: Executor):
+    """
+    Drop a broken pool without cancelling anything: its calls already failed with
+    `BrokenProcessPool`, and each caller retries inline. The next call starts a new pool.
+    """
+    global _executor, _executor_fingerprint
+    if _executor is executor:
+        _executor = _executor_fingerprint = None
+    executor.shutdown(wait=False)
+
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _threads() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="crafting-matcher")
+    return _thread_pool
+
+
+def _use_processes() -> bool:
+    return getattr(settings, "crafting_worker_processes", WORKER_PROCESSES) > 0
+
+
+async def _offload(name: str, key: Hashable, submit):
+    future = _pending.get(key)
+    if future is None:
+        future = asyncio.wrap_future(submit())
+        _pending[key] = future
+        while len(_pending) > MAX_PENDING:
+            _pending.popitem(last=False)
+    try:
+        result = await asyncio.wait_for(asyncio.shield(future), getattr(settings, "crafting_time_budget", TIME_BUDGET))
+    except asyncio.TimeoutError:
+        offloaded.inc(name, "still_computing")
+        raise StillComputing()
+    except BaseException:
+        _pending.pop(key, None)
+        raise
+    _pending.pop(key, None)
+    offloaded.inc(name, "completed")
+    return result
+
+
+async def match(catalog: RecipeCatalog, counts: Mapping[int, int]) -> List[int]:
+    """`compiled.match_recipes`, in the pool when expensive."""
+    if match_cost(catalog, counts) < getattr(settings, "crafting_offload_threshold", OFFLOAD_THRESHOLD):
+        return match_recipes(catalog, counts)
+
+    key = ("match", catalog.fingerprint, frozenset(counts.items()))
+    counts = dict(counts)
+    if not _use_processes():
+        return await _offload("match", key, lambda: _threads().submit(match_recipes, catalog, counts))
+    executor = _process_pool(catalog)
+    try:
+        return await _offload("match", key, lambda: executor.submit(worker_match, catalog.fingerprint, counts))
+    except (BrokenProcessPool, LookupError) as e:
+        log.warning(f"Crafting worker pool failed ({e!r}), matching inline")
+        _discard_pool(executor)
+        return match_recipes(catalog, counts)
+
+
+async def assign(recipe: CompiledRecipe, instances: Sequence[InstanceRow]) -> List[int]:
+    """`compiled.assign_ingredients`, in the pool when expensive."""
+    if len(instances) * max(1, len(recipe.ball_ids)) < getattr(
+        settings, "crafting_offload_threshold", OFFLOAD_THRESHOLD
+    ):
+        return assign_ingredients(recipe, instances)
+
+    instances = tuple(instances)
+    key = ("assign", recipe.id, instances)
+    # The recipe is small enough to send with each call, any live pool can run it
+    executor = _executor if _use_processes() and _executor is not None else _threads()
+    try:
+        return await _offload("assign", key, lambda: executor.submit(assign_ingredients, recipe, instances))
+    except BrokenProcessPool as e:
+        log.warning(f"Crafting worker pool failed ({e!r}), assigning inline")
+        if executor is not _thread_pool:
+            _discard_pool(executor)
+        return assign_ingredients(recipe, instances)
+
+
+def shutdown():
+    global _executor, _executor_fingerprint, _thread_pool
+    for future in _pending.values():
+        future.cancel()
+    _pending.clear()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = _executor_fingerprint = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
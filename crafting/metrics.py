@@ -0,0 +1,256 @@
+"""
+Counters and histograms for the crafting package.
+
+Metrics are disabled until `setup()` enables them; a disabled metric call is a single
+attribute check. When enabled they are either registered with the bot's
+prometheus_client registry (BallsDex `prometheus_enabled`), or served in the Prometheus
+text format on `settings.crafting_metrics_port` / `CRAFTING_METRICS_PORT` (localhost).
+"""
+import bisect
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from ballsdex.settings import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _State:
+    enabled = False
+
+
+_state = _State()
+_registry: List["_Metric"] = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        if not _state.enabled:
+            return
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value read when scraped."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.function = function
+
+    @property
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        return {(): self.function()}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not _state.enabled:
+            return
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+
+def now() -> float:
+    """Start time for `Histogram.observe(elapsed(start))`, 0 when metrics are disabled."""
+    return time.perf_counter() if _state.enabled else 0.0
+
+
+def elapsed(start: float) -> float:
+    return time.perf_counter() - start if start else 0.0
+
+
+def enabled() -> bool:
+    return _state.enabled
+
+
+# ---- crafting metrics ----
+
+command_latency = Histogram(
+    "crafting_command_duration_seconds", "Time spent handling a crafting command or button", ("command",)
+)
+matcher_duration = Histogram("crafting_matcher_duration_seconds", "Time spent finding matching recipes")
+matcher_candidates = Histogram(
+    "crafting_matcher_candidates", "Recipes evaluated per match", buckets=(1, 10, 100, 1000, 10000, 100000)
+)
+interaction_db_loads = Histogram(
+    "crafting_interaction_db_loads",
+    "Instance and recipe loads that reached the database per interaction",
+    ("command",),
+    buckets=(0, 1, 2, 5, 10, 20, 50),
+)
+avoided_queries = Counter("crafting_avoided_queries_total", "Lookups served by the per-interaction identity map")
+embed_edits = Counter(
+    "crafting_embed_edits_total", "Crafting session embed updates by outcome (sent, new_message, rate_limited, failed)",
+    ("outcome",),
+)
+crafts = Counter("crafting_crafts_total", "Craft attempts by result and failure reason", ("result", "reason"))
+balls_consumed = Counter("crafting_balls_consumed_total", "Ball instances consumed by crafting")
+
+
+def _active_sessions() -> float:
+    from .session_manager import crafting_sessions
+
+    return len(crafting_sessions)
+
+
+active_sessions = Gauge("crafting_active_sessions", "Open crafting sessions", _active_sessions)
+
+# Filled in once at startup, possibly before metrics are enabled
+startup_seconds: Dict[str, float] = {}
+cog_load_seconds = Gauge(
+    "crafting_cog_load_seconds", "Time taken by the extension setup", lambda: startup_seconds.get("cog_load", 0.0)
+)
+catalog_warm_up_seconds = Gauge(
+    "crafting_catalog_warm_up_seconds",
+    "Time taken by the first catalog build",
+    lambda: startup_seconds.get("catalog_warm_up", 0.0),
+)
+catalog_not_ready = Counter(
+    "crafting_catalog_not_ready_total", "Calls made before the catalog was built, by caller", ("caller",)
+)
+
+
+# ---- export ----
+
+def _format_labels(labelnames: Sequence[str], labels: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in list(metric.values.items()):
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {value}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(metric.labelnames, labels, f'le="{le}"')
+                lines.append(f"{metric.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(metric.labelnames, labels)} {total}")
+            lines.append(f"{metric.name}_count{_format_labels(metric.labelnames, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class _PrometheusCollector:
+    """Exposes the crafting metrics through prometheus_client's default registry."""
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+        for metric in _registry:
+            if metric.kind == "counter":
+                family = CounterMetricFamily(metric.name, metric.documentation, labels=metric.labelnames)
+                for labels, value in list(metric.values.items()):
+                    family.add_metric(labels, value)
+            elif metric.kind == "gauge":
+                family = GaugeMetricFamily(metric.name, metric.documentation, labels=metric.labelnames)
+                for labels, value in metric.values.items():
+                    family.add_metric(labels, value)
+            else:
+                family = HistogramMetricFamily(metric.name, metric.documentation, labels=metric.labelnames)
+                for labels, (counts, total) in list(metric.values.items()):
+                    cumulative = 0
+                    buckets = []
+                    for bound, count in zip(metric.buckets + (float("inf"),), counts):
+                        cumulative += count
+                        buckets.append(("+Inf" if bound == float("inf") else str(bound), cumulative))
+                    family.add_metric(labels, buckets, total)
+            yield family
+
+
+_collector: Optional[_PrometheusCollector] = None
+_runner = None
+
+
+async def setup():
+    """Enable metrics if the bot exports Prometheus metrics or a crafting metrics port is set."""
+    global _collector, _runner
+    if _state.enabled:
+        return
+
+    if getattr(settings, "prometheus_enabled", False):
+        try:
+            from prometheus_client import REGISTRY
+        except ImportError:
+            pass
+        else:
+            _collector = _PrometheusCollector()
+            REGISTRY.register(_collector)
+            _state.enabled = True
+            log.info("Crafting metrics registered with the bot's Prometheus registry")
+            return
+
+    port = getattr(settings, "crafting_metrics_port", None) or os.environ.get("CRAFTING_METRICS_PORT")
+    if not port:
+        return
+    port = int(port)
+
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    _runner = web.AppRunner(app)
+    await _runner.setup()
+    await web.TCPSite(_runner, "127.0.0.1", port).start()
+    _state.enabled = True
+    log.info(f"Crafting metrics served on http://127.0.0.1:{port}/metrics")
+
+
+async def shutdown():
+    global _collector, _runner
+    _state.enabled = False
+    if _collector is not None:
+        from prometheus_client import REGISTRY
+
+        REGISTRY.unregister(_collector)
+        _collector = None
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -1,21 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
-from enum import IntEnum
-from io import BytesIO
-from typing import TYPE_CHECKING, Iterable, Tuple, Type
-
-import discord
-from discord.utils import format_dt
-from tortoise import exceptions, fields, models, signals, timezone, validators
-from tortoise.contrib.postgres.indexes import PostgreSQLIndex
-from tortoise.expressions import Q
-
-from ballsdex.core.image_generator.image_gen import draw_card
-from ballsdex.settings import settings
-
-if TYPE_CHECKING:
-    from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise import fields, models
 
 
 class CraftingRecipe(models.Model):
@@ -64,3 +49,88 @@ class CraftingGroupOption(models.Model):
 
     def __str__(self) -> str:
         return f"{self.ball} in {self.group.name}" if hasattr(self, 'ball') and hasattr(self, 'group') else str(self.pk)
+
+
+class CraftingRecipeCompiled(models.Model):
+    """
+    Requirements of one recipe, maintained by the admin panel:
+    {"fixed": {"ball_id": quantity}, "groups": [[required_count, [ball_id, ...]]], "null_ingredients": n}
+    """
+    recipe_id = fields.IntField(pk=True)
+    result_id = fields.IntField()
+    requirements = fields.JSONField(default=dict)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "craftingrecipe_compiled"
+
+    def __str__(self) -> str:
+        return str(self.pk)
+
+
+class CraftingLog(models.Model):
+    id = fields.IntField(pk=True)
+    player = fields.ForeignKeyField("models.Player", related_name="crafting_logs")
+    recipe = fields.ForeignKeyField(
+        "models.CraftingRecipe", null=True, on_delete=fields.SET_NULL, related_name="logs"
+    )
+    result_ball = fields.ForeignKeyField("models.Ball", related_name=False)
+    result_instance_id = fields.IntField()  # plain id, the instance may be deleted later
+    result_attack_bonus = fields.IntField(default=0)
+    result_health_bonus = fields.IntField(default=0)
+    special = fields.ForeignKeyField("models.Special", null=True, on_delete=fields.SET_NULL, related_name=False)
+    # [{"id": ..., "ball_id": ..., "attack_bonus": ..., "health_bonus": ...}, ...]
+    consumed = fields.JSONField(default=list)
+    crafted_at = fields.DatetimeField()
+    duration_ms = fields.IntField(default=0)  # from the Craft press to the committed result
+
+    class Meta:
+        table = "craftinglog"
+
+    def __str__(self) -> str:
+        return str(self.pk)
+
+
+class CraftingDailyStat(models.Model):
+    """Per recipe per day rollup, incremented when crafting logs are written."""
+    id = fields.IntField(pk=True)
+    recipe = fields.ForeignKeyField("models.CraftingRecipe", related_name="daily_stats")
+    day = fields.DateField()
+    craft_count = fields.IntField(default=0)
+    balls_consumed = fields.IntField(default=0)
+    attack_delta_sum = fields.BigIntField(default=0)  # crafted bonus - sum of consumed bonuses
+    health_delta_sum = fields.BigIntField(default=0)
+
+    class Meta:
+        table = "craftingdailystat"
+        unique_together = ("recipe", "day")
+
+    def __str__(self) -> str:
+        return str(self.pk)
+
+class CraftingDailyBallConsumption(models.Model):
+    id = fields.IntField(pk=True)
+    recipe = fields.ForeignKeyField("models.CraftingRecipe", related_name="daily_consumption")
+    day = fields.DateField()
+    ball = fields.ForeignKeyField("models.Ball", related_name=False)
+    count = fields.IntField(default=0)
+
+    class Meta:
+        table = "craftingdailyballconsumption"
+        unique_together = ("recipe", "day", "ball")
+
+    def __str__(self) -> str:
+        return str(self.pk)
+
+
+class CraftingNotificationOptIn(models.Model):
+    """Players who asked for a DM when a catch completes a recipe."""
+    id = fields.IntField(pk=True)
+    player = fields.OneToOneField("models.Player", related_name="crafting_notifications")
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "craftingnotificationoptin"
+
+    def __str__(self) -> str:
+        return str(self.pk)
@@ -0,0 +1,186 @@
+"""
+"New recipe unlocked" DMs for players who opted in with `/craft notify`.
+
+A post_save listener on BallInstance looks only at the recipes using the caught ball
+(the catalog's ball index) against a cached ball_id -> count vector of the player's
+non-special instances, and queues the recipes whose deficit just reached 0. Queued
+recipes are sent as one DM per player every `BATCH_INTERVAL` seconds.
+"""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import discord
+from tortoise.functions import Count
+from tortoise.signals import Signals
+
+from ballsdex.core.models import BallInstance, balls
+
+from . import metrics
+from .catalog import get_catalog
+from .compiled import RecipeCatalog, recipe_deficit
+from .models import CraftingNotificationOptIn
+
+if TYPE_CHECKING:
+    from ballsdex.core.bot import BallsDexBot
+
+log = logging.getLogger(__name__)
+
+BATCH_INTERVAL = 15
+COUNTS_TTL = 900  # trades and releases are not seen, counts are reloaded after this
+MAX_CACHED_PLAYERS = 5000
+MAX_LISTED = 10
+
+notifications_sent = metrics.Counter("crafting_recipe_notifications_total", "Recipe unlocked DMs by outcome", ("outcome",))
+
+
+class _Counts:
+    __slots__ = ("counts", "expires_at")
+
+    def __init__(self, counts: Dict[int, int]):
+        self.counts = counts
+        self.expires_at = time.monotonic() + COUNTS_TTL
+
+
+class RecipeNotifier:
+    def __init__(self):
+        self.bot: Optional["BallsDexBot"] = None
+        self.opted_in: Dict[int, int] = {}  # player id -> discord id
+        self.counts: Dict[int, _Counts] = {}
+        self.pending: Dict[int, Dict[int, None]] = {}  # player id -> recipe ids, ordered and deduplicated
+        self.catalog: Optional[RecipeCatalog] = None  # refreshed by the flush loop
+        self._task: Optional[asyncio.Task] = None
+        self._background: set = set()
+
+    async def start(self, bot: "BallsDexBot"):
+        self.bot = bot
+        self.opted_in = dict(
+            await CraftingNotificationOptIn.all().values_list("player_id", "player__discord_id")
+        )
+        # Registered here rather than at import time so stop() can take it out again:
+        # Tortoise keeps listeners on the shared BallInstance class across extension reloads
+        BallInstance.register_listener(Signals.post_save, _ball_instance_saved)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        listeners = BallInstance._listeners[Signals.post_save].get(BallInstance, [])
+        if _ball_instance_saved in listeners:
+            listeners.remove(_ball_instance_saved)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def set_enabled(self, player, enabled: bool):
+        if enabled:
+            await CraftingNotificationOptIn.get_or_create(player=player)
+            self.opted_in[player.pk] = player.discord_id
+        else:
+            await CraftingNotificationOptIn.filter(player=player).delete()
+            self.opted_in.pop(player.pk, None)
+            self.counts.pop(player.pk, None)
+            self.pending.pop(player.pk, None)
+
+    def forget_player(self, player_id: int):
+        """Drop the cached counts, e.g. after instances were consumed."""
+        self.counts.pop(player_id, None)
+
+    def on_catch(self, instance: BallInstance):
+        if instance.player_id not in self.opted_in or instance.special_id is not None:
+            return
+        cached = self.counts.get(instance.player_id)
+        if cached is not None and cached.expires_at > time.monotonic():
+            self._check(instance.player_id, cached.counts, instance.ball_id)
+            return
+        # First catch seen for this player: load the counts off the catch path
+        task = asyncio.create_task(self._load_and_check(instance.player_id, instance.ball_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _load_and_check(self, player_id: int, ball_id: int):
+        catalog = self.catalog = await get_catalog()
+        rows = (
+            await BallInstance.filter(
+                player_id=player_id, special_id__isnull=True, ball_id__in=catalog.relevant_ball_ids
+            )
+            .annotate(count=Count("id"))
+            .group_by("ball_id")
+            .values_list("ball_id", "count")
+        )
+        counts = dict(rows)
+        # The new instance is already counted, step back one to see what it changed
+        if counts.get(ball_id):
+            counts[ball_id] -= 1
+        if len(self.counts) >= MAX_CACHED_PLAYERS:
+            self.counts.pop(next(iter(self.counts)))
+        self.counts[player_id] = _Counts(counts)
+        self._check(player_id, counts, ball_id)
+
+    def _check(self, player_id: int, counts: Dict[int, int], ball_id: int):
+        """Add one `ball_id` to `counts`, queueing the recipes it completes."""
+        catalog = self.catalog
+        incomplete = []
+        if catalog is not None:
+            for recipe_id in catalog.ball_index.get(ball_id, ()):
+                recipe = catalog.recipes[recipe_id]
+                if recipe_deficit(recipe, counts) > 0:
+                    incomplete.append(recipe)
+        counts[ball_id] = counts.get(ball_id, 0) + 1
+        for recipe in incomplete:
+            if recipe_deficit(recipe, counts) == 0:
+                self.pending.setdefault(player_id, {})[recipe.id] = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(BATCH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Failed to send recipe notifications")
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        if self.bot is None:
+            return
+        catalog = self.catalog = await get_catalog()
+        for player_id, recipe_ids in pending.items():
+            discord_id = self.opted_in.get(player_id)
+            if discord_id is None:
+                continue
+            results = [catalog.recipes[r].result_id for r in recipe_ids if r in catalog.recipes]
+            if results:
+                await self._send(discord_id, results)
+
+    async def _send(self, discord_id: int, result_ids: List[int]):
+        lines = []
+        for ball_id in result_ids[:MAX_LISTED]:
+            ball = balls.get(ball_id)
+            emoji = self.bot.get_emoji(ball.emoji_id) if ball else None
+            lines.append(f"{emoji or ''} {ball.country if ball else f'Ball {ball_id}'}".strip())
+        if len(result_ids) > MAX_LISTED:
+            lines.append(f"*+{len(result_ids) - MAX_LISTED} more*")
+        embed = discord.Embed(
+            title="🔨 New recipes unlocked!",
+            description="Your latest catches completed these recipes:\n" + "\n".join(lines),
+            color=0x00ff00,
+        )
+        embed.set_footer(text="Use /craft begin to craft them, /craft notify to turn these messages off")
+        try:
+            user = self.bot.get_user(discord_id) or await self.bot.fetch_user(discord_id)
+            await user.send(embed=embed)
+            notifications_sent.inc("sent")
+        except (discord.Forbidden, discord.NotFound):
+            notifications_sent.inc("undeliverable")
+        except discord.HTTPException as e:
+            notifications_sent.inc("failed")
+            log.warning(f"Failed to send recipe notification to {discord_id}: {e}")
+
+
+notifier = RecipeNotifier()
+
+
+async def _ball_instance_saved(sender, instance: BallInstance, created: bool, using_db, update_fields):
+    if created:
+        notifier.on_catch(instance)
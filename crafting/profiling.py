@@ -0,0 +1,170 @@
+"""
+Event-loop lag watchdog and on-demand stack sampler.
+
+Both run in a daemon thread and read the event loop thread's stack with
+`sys._current_frames()`, so they see what is blocking the loop while it is blocked
+instead of after it resumed.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LAG_THRESHOLD = 0.25  # seconds the loop may stay blocked before the watchdog logs it
+HEARTBEAT_INTERVAL = 0.05
+SAMPLE_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 60
+
+event_loop_lag = metrics.Histogram(
+    "crafting_event_loop_lag_seconds",
+    "Event loop lag measured by the crafting watchdog",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+def _is_crafting(code) -> bool:
+    return code.co_filename.startswith(PACKAGE_DIR)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{code.co_name}:{frame.f_lineno}"
+
+
+def _stack(frame) -> List:
+    """Frames of a thread, outermost first."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _collapse(frames) -> Optional[str]:
+    """`a;b;c` line for the sample, or None if no crafting code is on the stack."""
+    if not any(_is_crafting(frame.f_code) for frame in frames):
+        return None
+    return ";".join(_frame_name(frame) for frame in frames)
+
+
+class SamplingProfiler:
+    """
+    Samples the event loop thread every `interval` seconds and counts the stacks
+    that go through the crafting package, in the collapsed format read by
+    flamegraph.pl and speedscope. Other samples are counted as `[outside crafting]`.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        self.samples += 1
+        self.stacks[_collapse(_stack(frame)) or "[outside crafting]"] += 1
+
+    def run(self, seconds: float):
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            self.sample()
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile(seconds: float) -> SamplingProfiler:
+    """Sample the running loop for `seconds` from a worker thread. One profile at a time."""
+    if _profile_lock.locked():
+        raise RuntimeError("A profile is already running")
+    async with _profile_lock:
+        profiler = SamplingProfiler(threading.get_ident())
+        await asyncio.to_thread(profiler.run, seconds)
+        return profiler
+
+
+class LoopWatchdog:
+    """
+    A coroutine stamps a heartbeat every `interval`; a thread checks it, and when the
+    loop has not stamped it for more than `threshold` it logs the task and the
+    crafting frames currently running on the loop thread, once per stall.
+    """
+
+    def __init__(self, threshold: float = LAG_THRESHOLD, interval: float = HEARTBEAT_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.heartbeat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            event_loop_lag.observe(max(0.0, now - expected))
+            self.heartbeat = now
+
+    def _watch(self, stop: threading.Event):
+        reported = None
+        while not stop.wait(self.interval):
+            heartbeat = self.heartbeat
+            lag = time.monotonic() - heartbeat
+            if lag < self.threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+            self.report(lag)
+
+    def report(self, lag: float):
+        task = asyncio.current_task(self._loop)
+        frame = sys._current_frames().get(self._thread_id)
+        frames = [f for f in _stack(frame) if _is_crafting(f.f_code)] if frame is not None else []
+        where = " <- ".join(_frame_name(f) for f in reversed(frames))
+        if not where:
+            where = f"outside the crafting package ({_frame_name(frame) if frame is not None else 'idle'})"
+        coro = task.get_coro() if task is not None else None
+        log.warning(
+            f"Event loop blocked for {lag * 1000:.0f}ms in task "
+            f"{task.get_name() if task else None} ({getattr(coro, '__qualname__', coro)}): {where}"
+        )
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stop = threading.Event()
+        self._task = asyncio.create_task(self._beat())
+        threading.Thread(target=self._watch, args=(self._stop,), name="crafting-loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        self._task = None
+
+
+watchdog = LoopWatchdog()
@@ -0,0 +1,74 @@
+"""
+Soft reservations of crafting session ingredients, using `BallInstance.locked`: the
+lock BallsDex trades and donations already refuse (`is_locked()`, 30 minutes).
+
+Each session stamps its ingredients with its own `locked` value (`session['reserved_at']`)
+in one UPDATE that skips balls locked by anybody else. Remove, clear, cancel and timeout
+release them in one UPDATE matching that stamp, and the craft re-checks every consumed
+ball on the rows it locks (`holds`) instead of trusting the checks made when they were
+added. Balls of a
+session lost to a restart are released by the 30 minute expiry.
+"""
+from datetime import timedelta
+from typing import Iterable, List, Optional, Set
+
+from tortoise import timezone
+from tortoise.expressions import Q
+
+from ballsdex.core.models import BallInstance
+
+LOCK_DURATION = timedelta(minutes=30)  # BallsDex's is_locked() window
+REFRESH_AFTER = timedelta(minutes=10)  # restamp older reservations so they outlive long sessions
+
+
+def _owned(session, instance_ids: Iterable[int], stamp):
+    return BallInstance.filter(id__in=list(instance_ids), player_id=session['player'].pk, locked=stamp)
+
+
+async def reserve(session, instance_ids: List[int]) -> Set[int]:
+    """
+    Reserve `instance_ids` for the session. Returns the ids now reserved: those still
+    owned by the player and not locked by a trade or another session.
+    """
+    if not instance_ids:
+        return set()
+    now = timezone.now()
+    stamp = session.get('reserved_at')
+    if stamp is None or now - stamp > REFRESH_AFTER:
+        held = [pk for pk in session['ingredient_instances'] if pk not in instance_ids]
+        if stamp is not None and held:
+            await _owned(session, held, stamp).update(locked=now)
+        session['reserved_at'] = stamp = now
+
+    updated = await BallInstance.filter(
+        Q(locked__isnull=True) | Q(locked__lt=now - LOCK_DURATION),
+        id__in=instance_ids,
+        player_id=session['player'].pk,
+    ).update(locked=stamp)
+    if updated == len(set(instance_ids)):
+        return set(instance_ids)
+    return set(await _owned(session, instance_ids, stamp).values_list("id", flat=True))
+
+
+async def release(session, instance_ids: Optional[Iterable[int]] = None):
+    """Release `instance_ids` (every ingredient of the session by default)."""
+    stamp = session.get('reserved_at')
+    instance_ids = list(session['ingredient_instances'] if instance_ids is None else instance_ids)
+    if stamp is None or not instance_ids:
+        return
+    await _owned(session, instance_ids, stamp).update(locked=None)
+
+
+def holds(session, rows: List[Optional[tuple]]) -> bool:
+    """
+    Whether the session still holds every ingredient, from their `(id, player_id,
+    special_id, locked)` rows (None for a deleted one): owned, of the session's special
+    and reserved by the session.
+    """
+    stamp = session.get('reserved_at')
+    special = session.get('special')
+    special_id = special.pk if special else None
+    return stamp is not None and all(
+        row is not None and row[1] == session['player'].pk and row[2] == special_id and row[3] == stamp
+        for row in rows
+    )
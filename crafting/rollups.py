@@ -0,0 +1,64 @@
+from typing import Dict, Iterable, List, Tuple
+
+from .models import CraftingDailyBallConsumption, CraftingDailyStat, CraftingLog
+
+
+def aggregate_logs(rows: Iterable[CraftingLog]) -> Tuple[Dict[tuple, List[int]], Dict[tuple, int]]:
+    """
+    Reduce a batch of crafting logs to rollup increments:
+    `{(recipe_id, day): [crafts, consumed, atk_delta, hp_delta]}` and `{(recipe_id, day, ball_id): count}`.
+    Crafts of deleted recipes are skipped.
+    """
+    stats: Dict[tuple, List[int]] = {}
+    balls: Dict[tuple, int] = {}
+    for row in rows:
+        if row.recipe_id is None:
+            continue
+        day = row.crafted_at.date()
+        increment = stats.setdefault((row.recipe_id, day), [0, 0, 0, 0])
+        increment[0] += 1
+        increment[1] += len(row.consumed)
+        increment[2] += row.result_attack_bonus - sum(c["attack_bonus"] for c in row.consumed)
+        increment[3] += row.result_health_bonus - sum(c["health_bonus"] for c in row.consumed)
+        for consumed in row.consumed:
+            key = (row.recipe_id, day, consumed["ball_id"])
+            balls[key] = balls.get(key, 0) + 1
+    return stats, balls
+
+
+def _upsert(connection, table: str, key: Tuple[str, ...], counters: Tuple[str, ...]) -> str:
+    """INSERT of one row adding its counters to the existing row on a key conflict (PostgreSQL and SQLite)."""
+    columns = key + counters
+    if connection.capabilities.dialect == "postgres":
+        placeholders = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+    else:
+        placeholders = ", ".join("?" for _ in columns)
+    updates = ", ".join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in counters)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}"
+    )
+
+
+async def apply_rollups(rows: Iterable[CraftingLog], connection):
+    """
+    Add a batch of crafting logs to the daily rollups with one batched upsert per table.
+    Run it in the transaction writing the log rows so both are written or neither is;
+    the upsert also settles the creation race between bot processes without an error.
+    """
+    stats, balls = aggregate_logs(rows)
+    if stats:
+        await connection.execute_many(
+            _upsert(
+                connection,
+                CraftingDailyStat._meta.db_table,
+                ("recipe_id", "day"),
+                ("craft_count", "balls_consumed", "attack_delta_sum", "health_delta_sum"),
+            ),
+            [[recipe_id, day, *increments] for (recipe_id, day), increments in stats.items()],
+        )
+    if balls:
+        await connection.execute_many(
+            _upsert(connection, CraftingDailyBallConsumption._meta.db_table, ("recipe_id", "day", "ball_id"), ("count",)),
+            [[recipe_id, day, ball_id, count] for (recipe_id, day, ball_id), count in balls.items()],
+        )
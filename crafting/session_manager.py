@@ -2,10 +2,13 @@ from __future__ import annotations
 
 from typing import Dict, Optional, List
 import datetime
+import logging
 import traceback
 import threading
 
-from ballsdex.core.models import Player, Ball
+from ballsdex.core.models import Player
+
+log = logging.getLogger(__name__)
 
 class CraftingSessionData:
     def __init__(self, player: Player, ingredient_instances: List[int], special=None):
@@ -37,9 +40,9 @@ class CraftingSessionData:
             }
             self.debug_log.append(log_entry)
             
-            print(f"[SESSION {self.player.id}] {operation}: {details} "
-                  f"(ingredients: {len(self.ingredient_instances)}) "
-                  f"from {caller_info}")
+            log.debug(f"[SESSION {self.player.id}] {operation}: {details} "
+                      f"(ingredients: {len(self.ingredient_instances)}) "
+                      f"from {caller_info}")
     
     def to_dict(self) -> Dict[str, Optional[object]]:
         """Convert to the format expected by existing code"""
@@ -83,10 +86,10 @@ class CraftingSessionData:
     
     def print_debug_log(self):
         """Print full debug log for troubleshooting"""
-        print(f"[SESSION {self.player.id}] DEBUG LOG:")
+        log.debug(f"[SESSION {self.player.id}] DEBUG LOG:")
         for entry in self.debug_log:
-            print(f"  {entry['timestamp']}: {entry['operation']} - {entry['details']} "
-                  f"(from {entry['caller']})")
+            log.debug(f"  {entry['timestamp']}: {entry['operation']} - {entry['details']} "
+                      f"(from {entry['caller']})")
 
 _session_storage: Dict[int, CraftingSessionData] = {}
 
@@ -102,17 +105,17 @@ def create_session(user_id: int, player: Player, ingredient_instances: List[int]
         session.log_access("SESSION_CREATED", f"Initial ingredients: {len(ingredient_instances)}")
         _session_storage[user_id] = session
         
-        print(f"[SESSION_MANAGER] Created session for user {user_id} with {len(ingredient_instances)} ingredients")
+        log.debug(f"[SESSION_MANAGER] Created session for user {user_id} with {len(ingredient_instances)} ingredients")
         return True
     except Exception as e:
-        print(f"[SESSION_MANAGER] Failed to create session for user {user_id}: {e}")
+        log.error(f"[SESSION_MANAGER] Failed to create session for user {user_id}: {e}")
         return False
 
 def get_session(user_id: int) -> Optional[Dict[str, Optional[object]]]:
     """Get session data in the format expected by existing code"""
     if user_id not in _session_storage:
-        print(f"[SESSION_MANAGER] No session found for user {user_id}")
-        print(f"[SESSION_MANAGER] Available sessions: {list(_session_storage.keys())}")
+        log.debug(f"[SESSION_MANAGER] No session found for user {user_id}")
+        log.debug(f"[SESSION_MANAGER] Available sessions: {list(_session_storage.keys())}")
         return None
     
     session = _session_storage[user_id]
@@ -123,7 +126,7 @@ def get_session(user_id: int) -> Optional[Dict[str, Optional[object]]]:
         session.log_access("SESSION_INVALID", f"Reason: {reason}")
         session.print_debug_log()
         del _session_storage[user_id]
-        print(f"[SESSION_MANAGER] Removed invalid session for user {user_id}: {reason}")
+        log.debug(f"[SESSION_MANAGER] Removed invalid session for user {user_id}: {reason}")
         return None
     
     session.log_access("SESSION_ACCESSED", "Session data retrieved")
@@ -132,7 +135,7 @@ def get_session(user_id: int) -> Optional[Dict[str, Optional[object]]]:
 def update_session_ingredients(user_id: int, new_ingredients: List[int]) -> bool:
     """Update session ingredients safely"""
     if user_id not in _session_storage:
-        print(f"[SESSION_MANAGER] Cannot update ingredients - no session for user {user_id}")
+        log.debug(f"[SESSION_MANAGER] Cannot update ingredients - no session for user {user_id}")
         return False
     
     session = _session_storage[user_id]
@@ -143,7 +146,7 @@ def update_session_ingredients(user_id: int, new_ingredients: List[int]) -> bool
 def remove_session_ingredients(user_id: int, instance_ids: List[int]) -> bool:
     """Remove specific ingredients from session"""
     if user_id not in _session_storage:
-        print(f"[SESSION_MANAGER] Cannot remove ingredients - no session for user {user_id}")
+        log.debug(f"[SESSION_MANAGER] Cannot remove ingredients - no session for user {user_id}")
         return False
     
     session = _session_storage[user_id]
@@ -152,7 +155,7 @@ def remove_session_ingredients(user_id: int, instance_ids: List[int]) -> bool:
 def end_session(user_id: int, reason: str = "Manual") -> bool:
     """End a crafting session"""
     if user_id not in _session_storage:
-        print(f"[SESSION_MANAGER] Cannot end session - no session for user {user_id}")
+        log.debug(f"[SESSION_MANAGER] Cannot end session - no session for user {user_id}")
         return False
     
     session = _session_storage[user_id]
@@ -160,7 +163,7 @@ def end_session(user_id: int, reason: str = "Manual") -> bool:
     session.print_debug_log()
     del _session_storage[user_id]
     
-    print(f"[SESSION_MANAGER] Ended session for user {user_id}: {reason}")
+    log.debug(f"[SESSION_MANAGER] Ended session for user {user_id}: {reason}")
     return True
 
 def session_exists(user_id: int) -> bool:
@@ -193,7 +196,7 @@ def cleanup_expired_sessions() -> int:
         del _session_storage[user_id]
     
     if expired_users:
-        print(f"[SESSION_MANAGER] Cleaned up {len(expired_users)} expired sessions")
+        log.debug(f"[SESSION_MANAGER] Cleaned up {len(expired_users)} expired sessions")
     
     return len(expired_users)
 
@@ -0,0 +1,171 @@
+import functools
+import logging
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+
+from ballsdex.core.models import BallInstance
+
+from . import metrics
+from .models import CraftingRecipe
+
+log = logging.getLogger(__name__)
+
+RECIPE_PREFETCH = ("ingredients__ingredient", "ingredient_groups__options__ball", "result")
+
+# Process-wide debug counter of lookups served from an identity map instead of the DB
+avoided_queries_total = 0
+
+
+class UnitOfWork:
+    """Identity map living for exactly one interaction (one task)."""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.instances: Dict[int, BallInstance] = {}
+        self.recipes: Dict[int, CraftingRecipe] = {}
+        self.all_recipes_loaded = False
+        self.queries = 0
+        self.avoided_queries = 0
+
+    def avoided(self, count: int = 1):
+        global avoided_queries_total
+        self.avoided_queries += count
+        avoided_queries_total += count
+
+
+_current_unit: ContextVar[Optional[UnitOfWork]] = ContextVar("crafting_unit_of_work", default=None)
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    return _current_unit.get()
+
+
+def unit_of_work(func=None, *, label: Optional[str] = None):
+    """
+    Run an interaction callback with a fresh identity map, recording its latency and
+    DB loads under `label` (the function name by default; component callbacks are all
+    called `callback`, so give them one: `@unit_of_work(label="recipe_select")`).
+
+    discord.py runs every interaction in its own task, so the contextvar never
+    leaks between interactions; it is still reset on exit for nested callers.
+    """
+    if func is None:
+        return functools.partial(unit_of_work, label=label)
+    label = label or func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        unit = UnitOfWork(func.__qualname__)
+        token = _current_unit.set(unit)
+        start = metrics.now()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _current_unit.reset(token)
+            metrics.command_latency.observe(metrics.elapsed(start), label)
+            metrics.interaction_db_loads.observe(unit.queries, label)
+            if unit.avoided_queries:
+                metrics.avoided_queries.inc(amount=unit.avoided_queries)
+                log.debug(f"{unit.name}: {unit.queries} queries, "
+                          f"{unit.avoided_queries} avoided ({avoided_queries_total} total)")
+
+    return wrapper
+
+
+def remember_instances(instances: Iterable[BallInstance]):
+    """Seed the identity map with instances that were already loaded (e.g. by a transformer)."""
+    unit = _current_unit.get()
+    if unit is None:
+        return
+    for instance in instances:
+        unit.instances[instance.pk] = instance
+
+
+def forget_instances(instance_ids: Iterable[int]):
+    """Drop instances that no longer exist (consumed by a craft)."""
+    unit = _current_unit.get()
+    if unit is None:
+        return
+    for instance_id in instance_ids:
+        unit.instances.pop(instance_id, None)
+
+
+async def get_instances(instance_ids: Iterable[int]) -> List[BallInstance]:
+    """
+    Load ball instances (with ball and special) by primary key, in the given order.
+    Missing rows are skipped. Rows already loaded during this interaction are not queried again.
+    """
+    instance_ids = list(dict.fromkeys(instance_ids))
+    if not instance_ids:
+        return []
+
+    unit = _current_unit.get()
+    if unit is None:
+        instances = await BallInstance.filter(id__in=instance_ids).prefetch_related("ball", "special")
+        by_id = {instance.pk: instance for instance in instances}
+        return [by_id[i] for i in instance_ids if i in by_id]
+
+    missing = [i for i in instance_ids if i not in unit.instances]
+    if missing:
+        unit.queries += 1
+        for instance in await BallInstance.filter(id__in=missing).prefetch_related("ball", "special"):
+            unit.instances[instance.pk] = instance
+    else:
+        unit.avoided()
+    return [unit.instances[i] for i in instance_ids if i in unit.instances]
+
+
+async def get_recipes(recipe_ids: Optional[Iterable[int]] = None) -> List[CraftingRecipe]:
+    """
+    Load recipes with their ingredients, groups and options: every recipe, or the given
+    ids in that order (missing rows are skipped). Each recipe is loaded once per interaction.
+    """
+    if recipe_ids is None:
+        return await _get_all_recipes()
+
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return []
+
+    unit = _current_unit.get()
+    if unit is None:
+        recipes = await CraftingRecipe.filter(id__in=recipe_ids).prefetch_related(*RECIPE_PREFETCH)
+        by_id = {recipe.pk: recipe for recipe in recipes}
+        return [by_id[i] for i in recipe_ids if i in by_id]
+
+    missing = [i for i in recipe_ids if i not in unit.recipes]
+    if missing and not unit.all_recipes_loaded:
+        unit.queries += 1
+        for recipe in await CraftingRecipe.filter(id__in=missing).prefetch_related(*RECIPE_PREFETCH):
+            unit.recipes[recipe.pk] = recipe
+    else:
+        unit.avoided()
+    return [unit.recipes[i] for i in recipe_ids if i in unit.recipes]
+
+
+async def _get_all_recipes() -> List[CraftingRecipe]:
+    unit = _current_unit.get()
+    if unit is None:
+        return await CraftingRecipe.all().prefetch_related(*RECIPE_PREFETCH)
+
+    if unit.all_recipes_loaded:
+        unit.avoided()
+    else:
+        unit.queries += 1
+        for recipe in await CraftingRecipe.all().prefetch_related(*RECIPE_PREFETCH):
+            unit.recipes[recipe.pk] = recipe
+        unit.all_recipes_loaded = True
+    return list(unit.recipes.values())
+
+
+async def related(relation) -> list:
+    """Read a reverse relation, using the prefetched rows when they are there."""
+    if getattr(relation, "_fetched", False):
+        unit = _current_unit.get()
+        if unit is not None:
+            unit.avoided()
+        return list(relation)
+    unit = _current_unit.get()
+    if unit is not None:
+        unit.queries += 1
+    return await relation.all()
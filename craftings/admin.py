@@ -1,20 +1,79 @@
 from typing import TYPE_CHECKING, Any
 
+from django import forms
 from django.contrib import admin
-from .models import CraftingRecipe, CraftingIngredient, CraftingIngredientGroup, CraftingGroupOption
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from bd_models.models import Ball
+from .analysis import analyze_catalog
+from .catalog_io import CatalogError, dump_csv, dump_json, export_catalog, import_catalog, parse, validate
+from .compiled import rebuild
+from .models import CraftingRecipe, CraftingIngredient, CraftingIngredientGroup, CraftingGroupOption, CraftingLog, CraftingDailyStat, CraftingDailyBallConsumption
 from django.utils.safestring import mark_safe
 
+# Groups with more options than this are edited from the paginated option list instead of an inline
+OPTIONS_INLINE_LIMIT = 50
+# Rows shown per section of the catalog analysis page
+ANALYSIS_ROWS = 200
+
+
+def count_subquery(model, field: str = "recipe"):
+    """Correlated COUNT(*) of `model` rows pointing at the outer row, 0 when there are none."""
+    counts = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class ResultBallFilter(admin.SimpleListFilter):
+    """Only lists balls that are the result of a recipe (index lookup on result_id), not the whole ball table."""
+    title = "result"
+    parameter_name = "result"
+
+    def lookups(self, request, model_admin):
+        used = CraftingRecipe.objects.order_by().values("result_id")
+        return Ball.objects.filter(pk__in=used).order_by("country").values_list("pk", "country")
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(result_id=self.value())
+        return queryset
+
+
+class CatalogImportForm(forms.Form):
+    file = forms.FileField(help_text="JSON or CSV export of the crafting catalog")
+    replace = forms.BooleanField(
+        required=False,
+        help_text="Delete recipes that are not in the file; changed recipes are updated in place and keep their history",
+    )
+    dry_run = forms.BooleanField(required=False, initial=True, help_text="Only show what would change")
+
+
 class CraftingIngredientInline(admin.TabularInline):
     model = CraftingIngredient
     extra = 1
     autocomplete_fields = ("ingredient",)
     fields = ("ingredient", "quantity") 
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("ingredient")
+
 class CraftingGroupOptionInline(admin.TabularInline):
     model = CraftingGroupOption
     extra = 1
     autocomplete_fields = ("ball",)
     fields = ("ball",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("ball")
     
 class CraftingIngredientGroupInline(admin.StackedInline):
     model = CraftingIngredientGroup
@@ -24,13 +83,231 @@ class CraftingIngredientGroupInline(admin.StackedInline):
     
 @admin.register(CraftingRecipe)
 class CraftingRecipeAdmin(admin.ModelAdmin):
-    list_display = ("result",)
+    list_display = ("result", "ingredient_count", "group_count")
+    list_select_related = ("result",)
+    list_filter = (ResultBallFilter,)
+    list_per_page = 50
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
     inlines = [CraftingIngredientInline, CraftingIngredientGroupInline]
-    search_fields = ("result__name",)
+    search_fields = ("result__country", "ingredient_groups__name")
     autocomplete_fields = ("result",)  
+    actions = ("export_json", "export_csv", "rebuild_compiled")
+
+    def get_urls(self):
+        urls = [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="craftings_craftingrecipe_import",
+            ),
+            path(
+                "analyze/",
+                self.admin_site.admin_view(self.analyze_view),
+                name="craftings_craftingrecipe_analyze",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request) or not self.has_delete_permission(request):
+            return HttpResponse(status=403)
+        context = dict(self.admin_site.each_context(request), opts=self.model._meta, title="Import crafting catalog")
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            format = "csv" if upload.name.lower().endswith(".csv") else "json"
+            try:
+                resolved = validate(parse(upload.read().decode("utf-8-sig"), format))
+                context["diff"] = import_catalog(
+                    resolved, replace=form.cleaned_data["replace"], dry_run=form.cleaned_data["dry_run"]
+                )
+                context["dry_run"] = form.cleaned_data["dry_run"]
+            except (CatalogError, UnicodeDecodeError) as e:
+                context["errors"] = getattr(e, "errors", [str(e)])
+        context["form"] = form
+        return TemplateResponse(request, "admin/craftings/craftingrecipe/import.html", context)
+
+    def analyze_view(self, request):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        report = analyze_catalog()
+        names = dict(Ball.objects.filter(crafted_by__isnull=False).values_list("crafted_by", "country"))
+
+        def link(recipe_id):
+            url = reverse("admin:craftings_craftingrecipe_change", args=(recipe_id,))
+            return format_html('<a href="{}">#{} {}</a>', url, recipe_id, names.get(recipe_id, "?"))
+
+        limit = ANALYSIS_ROWS
+        sections = [
+            ("Subsumed: crafting the second recipe always matches the first too",
+             len(report.subsumed), [format_html("{} &le; {}", link(a), link(b)) for a, b in report.subsumed[:limit]]),
+            ("Ambiguous: the minimal ingredients of one can match both (may over-report recipes with overlapping requirements)",
+             len(report.ambiguous), [format_html("{} / {}", link(a), link(b)) for a, b in report.ambiguous[:limit]]),
+            ("Infeasible", len(report.infeasible),
+             [format_html("{}: {}", link(r), problem) for r, problem in report.infeasible[:limit]]),
+            ("Overlapping requirements: craftable with the minimum, but consuming the ingredients fails",
+             len(report.overlapping), [format_html("{}: {}", link(r), problem) for r, problem in report.overlapping[:limit]]),
+            ("Duplicate group options", len(report.duplicate_options),
+             [format_html("{}: ball {} listed {} times in group {}", link(r), ball, count, group)
+              for r, group, ball, count in report.duplicate_options[:limit]]),
+        ]
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Crafting catalog analysis",
+            summary=report.summary(),
+            sections=[(title, total, rows, total - len(rows)) for title, total, rows in sections],
+        )
+        return TemplateResponse(request, "admin/craftings/craftingrecipe/analysis.html", context)
+
+    def _export(self, queryset, format: str) -> HttpResponse:
+        recipes = export_catalog(queryset)
+        if format == "csv":
+            response = HttpResponse(dump_csv(recipes), content_type="text/csv")
+        else:
+            response = HttpResponse(dump_json(recipes), content_type="application/json")
+        response["Content-Disposition"] = f'attachment; filename="crafting_catalog.{format}"'
+        return response
+
+    @admin.action(description="Export selected recipes as JSON")
+    def export_json(self, request, queryset):
+        return self._export(queryset, "json")
+
+    @admin.action(description="Export selected recipes as CSV")
+    def export_csv(self, request, queryset):
+        return self._export(queryset, "csv")
+
+    @admin.action(description="Rebuild compiled recipes (what the bot loads)", permissions=("change",))
+    def rebuild_compiled(self, request, queryset):
+        count = rebuild(queryset.values_list("pk", flat=True))
+        self.message_user(request, f"Rebuilt {count} compiled recipe(s).")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            ingredient_count=count_subquery(CraftingIngredient),
+            group_count=count_subquery(CraftingIngredientGroup),
+        )
+
+    @admin.display(description="Ingredients", ordering="ingredient_count")
+    def ingredient_count(self, obj: CraftingRecipe) -> int:
+        return obj.ingredient_count
+
+    @admin.display(description="Groups", ordering="group_count")
+    def group_count(self, obj: CraftingRecipe) -> int:
+        return obj.group_count
 
 @admin.register(CraftingIngredientGroup)
 class CraftingIngredientGroupAdmin(admin.ModelAdmin):
-    list_display = ("name", "required_count", "recipe")
+    list_display = ("name", "required_count", "recipe", "option_count")
+    list_select_related = ("recipe__result",)
+    list_per_page = 50
+    show_full_result_count = False
     inlines = [CraftingGroupOptionInline]
-    search_fields = ("ball__name", "group__name") 
+    search_fields = ("name", "recipe__result__country")
+    autocomplete_fields = ("recipe",)
+    readonly_fields = ("options_link",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(option_count=count_subquery(CraftingGroupOption, "group"))
+
+    def get_inlines(self, request, obj):
+        # Rendering hundreds of autocomplete rows is unusable, large groups use the paginated option list
+        if obj is not None and obj.option_count > OPTIONS_INLINE_LIMIT:
+            return []
+        return self.inlines
+
+    @admin.display(description="Options", ordering="option_count")
+    def option_count(self, obj: CraftingIngredientGroup) -> int:
+        return obj.option_count
+
+    @admin.display(description="Edit options")
+    def options_link(self, obj: CraftingIngredientGroup) -> str:
+        if obj.pk is None:
+            return "-"
+        changelist = reverse("admin:craftings_craftinggroupoption_changelist")
+        add = reverse("admin:craftings_craftinggroupoption_add")
+        return format_html(
+            '<a href="{}?group__id__exact={}">Browse the {} options</a> | <a href="{}?group={}">Add an option</a>',
+            changelist, obj.pk, obj.option_count, add, obj.pk,
+        )
+
+@admin.register(CraftingGroupOption)
+class CraftingGroupOptionAdmin(admin.ModelAdmin):
+    list_display = ("ball", "group")
+    list_select_related = ("ball", "group")
+    list_per_page = 100
+    show_full_result_count = False
+    search_fields = ("ball__country", "group__name")
+    autocomplete_fields = ("ball",)
+    raw_id_fields = ("group",)
+    ordering = ("ball__country",)
+
+    def lookup_allowed(self, lookup, value, request=None):
+        # links from the group page filter on the group id
+        if lookup == "group__id__exact":
+            return True
+        return super().lookup_allowed(lookup, value, request)
+
+
+@admin.register(CraftingLog)
+class CraftingLogAdmin(admin.ModelAdmin):
+    list_display = ("id", "player", "result_ball", "special", "consumed_count", "crafted_at", "duration_ms")
+    list_select_related = ("player", "result_ball", "special")
+    search_fields = ("=player__discord_id", "result_ball__country", "=result_instance_id")
+    date_hierarchy = "crafted_at"
+    ordering = ("-crafted_at",)
+    raw_id_fields = ("player", "recipe", "result_ball", "special")
+
+    @admin.display(description="Consumed")
+    def consumed_count(self, obj: CraftingLog) -> int:
+        return len(obj.consumed)
+
+    # Audit trail: rows are written by the bot only
+    def has_add_permission(self, request) -> bool:
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
+
+    def has_delete_permission(self, request, obj=None) -> bool:
+        return False
+
+
+class ReadOnlyRollupAdmin(admin.ModelAdmin):
+    """Rollups are maintained incrementally by the bot, never edited by hand."""
+    date_hierarchy = "day"
+    ordering = ("-day",)
+    show_full_result_count = False
+
+    def has_add_permission(self, request) -> bool:
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
+
+    def has_delete_permission(self, request, obj=None) -> bool:
+        return False
+
+
+@admin.register(CraftingDailyStat)
+class CraftingDailyStatAdmin(ReadOnlyRollupAdmin):
+    list_display = ("day", "recipe", "craft_count", "balls_consumed", "average_attack_delta", "average_health_delta")
+    list_select_related = ("recipe__result",)
+    search_fields = ("recipe__result__country",)
+
+    @admin.display(description="Avg ATK delta")
+    def average_attack_delta(self, obj: CraftingDailyStat) -> str:
+        return f"{obj.attack_delta_sum / obj.craft_count:+.1f}" if obj.craft_count else "-"
+
+    @admin.display(description="Avg HP delta")
+    def average_health_delta(self, obj: CraftingDailyStat) -> str:
+        return f"{obj.health_delta_sum / obj.craft_count:+.1f}" if obj.craft_count else "-"
+
+
+@admin.register(CraftingDailyBallConsumption)
+class CraftingDailyBallConsumptionAdmin(ReadOnlyRollupAdmin):
+    list_display = ("day", "ball", "count", "recipe")
+    list_select_related = ("ball", "recipe__result")
+    search_fields = ("ball__country", "recipe__result__country")
+
@@ -0,0 +1,279 @@
+"""
+Static checks of the recipe catalog, for the admin panel and `manage.py craftinganalyze`.
+
+The catalog is compiled into the same plain-data form the bot matches against
+(`crafting/compiled.py`, which the admin panel does not ship): fixed ingredient
+quantities per ball plus (required count, option balls) per group. A ball -> recipes
+index keeps the pair checks to recipes sharing a ball instead of every pair.
+
+Reported:
+- subsumed: crafting recipe B always also matches recipe A (B's requirements cover A's)
+- ambiguous: the minimal ingredients of one recipe can also match the other, so the
+  player gets the "Multiple Recipes Available" prompt (exact for recipes without
+  overlapping requirements, an over-approximation for the others)
+- infeasible: recipes that can never be offered or crafted
+- overlapping: a ball counted by two requirements of the same recipe; the recipe shows
+  as craftable with the minimum but consuming the ingredients then fails
+- duplicate options: the same ball listed twice in a group
+"""
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .models import CraftingGroupOption, CraftingIngredient, CraftingIngredientGroup, CraftingRecipe
+
+
+@dataclass
+class RecipeRequirements:
+    id: int
+    result_id: int
+    fixed: Dict[int, int] = field(default_factory=dict)  # ball_id -> quantity
+    groups: List[Tuple[int, int, FrozenSet[int]]] = field(default_factory=list)  # (group_id, required, options)
+    null_ingredients: int = 0
+
+    @property
+    def ball_ids(self) -> FrozenSet[int]:
+        ids = set(self.fixed)
+        for _, _, options in self.groups:
+            ids.update(options)
+        return frozenset(ids)
+
+
+@dataclass
+class AnalysisReport:
+    recipes: int = 0
+    subsumed: List[Tuple[int, int]] = field(default_factory=list)  # (recipe, recipe that covers it)
+    ambiguous: List[Tuple[int, int]] = field(default_factory=list)
+    infeasible: List[Tuple[int, str]] = field(default_factory=list)
+    overlapping: List[Tuple[int, str]] = field(default_factory=list)
+    duplicate_options: List[Tuple[int, int, int, int]] = field(default_factory=list)  # (recipe, group, ball, count)
+
+    def summary(self) -> str:
+        return (
+            f"{self.recipes} recipe(s): {len(self.subsumed)} subsumed pair(s), {len(self.ambiguous)} ambiguous pair(s), "
+            f"{len(self.infeasible)} infeasible, {len(self.overlapping)} overlapping, "
+            f"{len(self.duplicate_options)} duplicate option(s)"
+        )
+
+
+def compile_catalog(
+    recipe_ids: Optional[Iterable[int]] = None,
+) -> Tuple[List[RecipeRequirements], List[Tuple[int, int, int, int]]]:
+    """
+    Requirements of every recipe (or of `recipe_ids`), one flat query per table, plus
+    duplicated group options.
+    """
+    recipe_rows = CraftingRecipe.objects.all()
+    ingredient_rows = CraftingIngredient.objects.all()
+    group_rows = CraftingIngredientGroup.objects.all()
+    option_rows = CraftingGroupOption.objects.all()
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        recipe_rows = recipe_rows.filter(pk__in=recipe_ids)
+        ingredient_rows = ingredient_rows.filter(recipe_id__in=recipe_ids)
+        group_rows = group_rows.filter(recipe_id__in=recipe_ids)
+        option_rows = option_rows.filter(group__recipe_id__in=recipe_ids)
+
+    recipes: Dict[int, RecipeRequirements] = {
+        pk: RecipeRequirements(pk, result_id)
+        for pk, result_id in recipe_rows.values_list("pk", "result_id")
+    }
+    for recipe_id, ball_id, quantity in ingredient_rows.values_list("recipe_id", "ingredient_id", "quantity"):
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            continue
+        if ball_id is None:
+            recipe.null_ingredients += 1
+        else:
+            recipe.fixed[ball_id] = recipe.fixed.get(ball_id, 0) + quantity
+
+    option_counts = Counter(option_rows.values_list("group_id", "ball_id"))
+    options: Dict[int, set] = {}
+    for group_id, ball_id in option_counts:
+        options.setdefault(group_id, set()).add(ball_id)
+
+    duplicates = []
+    group_recipe = {}
+    for group_id, recipe_id, required in group_rows.values_list("pk", "recipe_id", "required_count"):
+        group_recipe[group_id] = recipe_id
+        recipe = recipes.get(recipe_id)
+        if recipe is not None:
+            recipe.groups.append((group_id, required, frozenset(options.get(group_id, ()))))
+    for (group_id, ball_id), count in option_counts.items():
+        if count > 1 and group_id in group_recipe:
+            duplicates.append((group_recipe[group_id], group_id, ball_id, count))
+    return list(recipes.values()), duplicates
+
+
+def _guaranteed(recipe: RecipeRequirements, balls: FrozenSet[int]) -> int:
+    """Fewest balls from `balls` in any input that crafts `recipe`."""
+    from_fixed = sum(quantity for ball_id, quantity in recipe.fixed.items() if ball_id in balls)
+    from_groups = max((required for _, required, options in recipe.groups if options and options <= balls), default=0)
+    return max(from_fixed, from_groups)
+
+
+def _provided(recipe: RecipeRequirements, balls: FrozenSet[int]) -> int:
+    """Most balls from `balls` in the smallest inputs that craft `recipe`."""
+    return sum(quantity for ball_id, quantity in recipe.fixed.items() if ball_id in balls) + sum(
+        required for _, required, options in recipe.groups if options & balls
+    )
+
+
+def _requirements(recipe: RecipeRequirements) -> Iterable[Tuple[FrozenSet[int], int]]:
+    for ball_id, quantity in recipe.fixed.items():
+        yield frozenset((ball_id,)), quantity
+    for _, required, options in recipe.groups:
+        yield options, required
+
+
+def is_subsumed(recipe: RecipeRequirements, by: RecipeRequirements) -> bool:
+    """Whether every input crafting `by` also crafts `recipe`."""
+    return all(_guaranteed(by, balls) >= needed for balls, needed in _requirements(recipe))
+
+
+def _disjoint(recipe: RecipeRequirements) -> bool:
+    """Whether no ball counts for two requirements of the recipe (see `overlapping`)."""
+    seen = set(recipe.fixed)
+    for _, _, options in recipe.groups:
+        if options & seen:
+            return False
+        seen |= options
+    return True
+
+
+def _max_flow(capacity: Dict[Any, Dict[Any, int]], source: Any, sink: Any) -> int:
+    """Shortest augmenting paths; the graphs here have a few dozen nodes."""
+    flow = 0
+    while True:
+        parents = {source: None}
+        queue = deque([source])
+        while queue and sink not in parents:
+            node = queue.popleft()
+            for following, left in capacity[node].items():
+                if left > 0 and following not in parents:
+                    parents[following] = node
+                    queue.append(following)
+        if sink not in parents:
+            return flow
+        path = []
+        node = sink
+        while parents[node] is not None:
+            path.append((parents[node], node))
+            node = parents[node]
+        bottleneck = min(capacity[a][b] for a, b in path)
+        for a, b in path:
+            capacity[a][b] -= bottleneck
+            capacity[b][a] = capacity[b].get(a, 0) + bottleneck
+        flow += bottleneck
+
+
+def _joint_match(recipe: RecipeRequirements, of: RecipeRequirements) -> bool:
+    """
+    One assignment for all of `recipe`'s requirements at once: `of`'s fixed quantities
+    and each group's required count, spread over its options, flow through the balls
+    to the requirements of `recipe` that count them.
+    """
+    needs = list(_requirements(recipe))
+    total = sum(needed for _, needed in needs)
+    capacity: Dict[Any, Dict[Any, int]] = defaultdict(dict)
+    for i, (balls, supplied) in enumerate(_requirements(of)):
+        capacity["source"][("supply", i)] = supplied
+        for ball_id in balls:
+            capacity[("supply", i)][("ball", ball_id)] = total
+    for i, (balls, needed) in enumerate(needs):
+        for ball_id in balls:
+            capacity[("ball", ball_id)][("need", i)] = total
+        capacity[("need", i)]["sink"] = needed
+    return _max_flow(capacity, "source", "sink") >= total
+
+
+def can_match_with_minimum(recipe: RecipeRequirements, of: RecipeRequirements) -> bool:
+    """
+    Whether some smallest input crafting `of` also crafts `recipe`.
+
+    Exact when neither recipe counts a ball for two requirements. Otherwise (recipes
+    reported as overlapping) each requirement of `recipe` is only checked against the
+    most `of` can provide for it, which over-reports: those maxima may not be reachable
+    with one input.
+    """
+    if not all(_provided(of, balls) >= needed for balls, needed in _requirements(recipe)):
+        return False
+    if not (_disjoint(recipe) and _disjoint(of)):
+        return True
+    return _joint_match(recipe, of)
+
+
+def _problems(recipe: RecipeRequirements) -> Tuple[List[str], List[str]]:
+    infeasible, overlapping = [], []
+    if recipe.null_ingredients:
+        infeasible.append(f"{recipe.null_ingredients} ingredient(s) without a ball")
+    if not recipe.fixed and not recipe.groups:
+        infeasible.append("no ingredients")
+    for ball_id, quantity in recipe.fixed.items():
+        if quantity <= 0:
+            infeasible.append(f"quantity {quantity} for ball {ball_id}")
+    seen_groups: List[Tuple[int, FrozenSet[int]]] = []
+    for group_id, required, options in recipe.groups:
+        if required > 0 and not options:
+            infeasible.append(f"group {group_id} needs {required} ball(s) but has no options")
+        shared = options & frozenset(recipe.fixed)
+        if shared:
+            overlapping.append(f"group {group_id} options are also fixed ingredients ({len(shared)} ball(s))")
+        for other_id, other_options in seen_groups:
+            if options & other_options:
+                overlapping.append(f"groups {other_id} and {group_id} share {len(options & other_options)} option(s)")
+        seen_groups.append((group_id, options))
+    return infeasible, overlapping
+
+
+def _pivot(recipe: RecipeRequirements, index: Dict[int, List[int]]) -> FrozenSet[int]:
+    """The requirement whose balls appear in the fewest recipes."""
+    best, best_size = frozenset(), None
+    for balls, needed in _requirements(recipe):
+        if needed <= 0 or not balls:
+            continue
+        size = sum(len(index.get(ball_id, ())) for ball_id in balls)
+        if best_size is None or size < best_size:
+            best, best_size = balls, size
+    return best
+
+
+def analyze(
+    recipes: List[RecipeRequirements], duplicates: Optional[List[Tuple[int, int, int, int]]] = None
+) -> AnalysisReport:
+    report = AnalysisReport(recipes=len(recipes), duplicate_options=list(duplicates or ()))
+    by_id = {recipe.id: recipe for recipe in recipes}
+    index: Dict[int, List[int]] = {}
+    for recipe in recipes:
+        for ball_id in recipe.ball_ids:
+            index.setdefault(ball_id, []).append(recipe.id)
+
+    ambiguous = set()
+    for recipe in recipes:
+        infeasible, overlapping = _problems(recipe)
+        report.infeasible += [(recipe.id, problem) for problem in infeasible]
+        report.overlapping += [(recipe.id, problem) for problem in overlapping]
+        if infeasible:
+            continue
+
+        # Any recipe covering this one, or whose minimum can match it, has a ball of each of its requirements
+        candidates = set()
+        for ball_id in _pivot(recipe, index):
+            candidates.update(index.get(ball_id, ()))
+        candidates.discard(recipe.id)
+
+        for other_id in candidates:
+            other = by_id[other_id]
+            if is_subsumed(recipe, other):
+                report.subsumed.append((recipe.id, other_id))
+            elif can_match_with_minimum(recipe, other):
+                ambiguous.add((min(recipe.id, other_id), max(recipe.id, other_id)))
+
+    subsumed_pairs = {(min(a, b), max(a, b)) for a, b in report.subsumed}
+    report.ambiguous = sorted(ambiguous - subsumed_pairs)
+    report.subsumed.sort()
+    return report
+
+
+def analyze_catalog() -> AnalysisReport:
+    return analyze(*compile_catalog())
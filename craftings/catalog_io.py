@@ -0,0 +1,334 @@
+"""
+Import and export of the whole crafting catalog (recipes, fixed ingredients, groups
+and options) as JSON or CSV, with balls referenced by their country name.
+
+JSON::
+
+    {"recipes": [{"result": "France",
+                  "ingredients": [{"ball": "Germany", "quantity": 2}],
+                  "groups": [{"name": "Europe", "required_count": 1, "options": ["Spain", "Italy"]}]}]}
+
+CSV, one row per fixed ingredient or group option, rows sharing the `recipe` key form
+one recipe::
+
+    recipe,result,kind,ball,quantity,group,required_count
+    1,France,ingredient,Germany,2,,
+    1,France,option,Spain,,Europe,1
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from django.db import transaction
+
+from bd_models.models import Ball
+
+from .compiled import rebuild
+from .models import CraftingGroupOption, CraftingIngredient, CraftingIngredientGroup, CraftingRecipe
+
+CSV_COLUMNS = ("recipe", "result", "kind", "ball", "quantity", "group", "required_count")
+
+
+class CatalogError(Exception):
+    def __init__(self, errors: list[str]):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+@dataclass
+class CatalogDiff:
+    added: list[dict] = field(default_factory=list)
+    updated: list[tuple[CraftingRecipe, dict]] = field(default_factory=list)
+    removed: list[CraftingRecipe] = field(default_factory=list)
+    unchanged: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} recipe(s) added, {len(self.updated)} updated, "
+            f"{len(self.removed)} removed, {self.unchanged} unchanged"
+        )
+
+
+# ---- export ----
+
+def export_catalog(queryset=None) -> list[dict[str, Any]]:
+    """Serialize recipes (all by default), with one query per table."""
+    if queryset is None:
+        queryset = CraftingRecipe.objects.all()
+    queryset = queryset.select_related("result").prefetch_related(
+        "ingredients__ingredient", "ingredient_groups__options__ball"
+    ).order_by("pk")
+    return [
+        {
+            "result": recipe.result.country,
+            "ingredients": [
+                {"ball": ingredient.ingredient.country, "quantity": ingredient.quantity}
+                for ingredient in recipe.ingredients.all()
+            ],
+            "groups": [
+                {
+                    "name": group.name,
+                    "required_count": group.required_count,
+                    "options": sorted(option.ball.country for option in group.options.all()),
+                }
+                for group in recipe.ingredient_groups.all()
+            ],
+        }
+        for recipe in queryset
+    ]
+
+
+def dump_json(recipes: list[dict[str, Any]]) -> str:
+    return json.dumps({"recipes": recipes}, indent=2, ensure_ascii=False)
+
+
+def dump_csv(recipes: list[dict[str, Any]]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for key, recipe in enumerate(recipes, start=1):
+        for ingredient in recipe["ingredients"]:
+            writer.writerow((key, recipe["result"], "ingredient", ingredient["ball"], ingredient["quantity"], "", ""))
+        for group in recipe["groups"]:
+            for option in group["options"]:
+                writer.writerow((key, recipe["result"], "option", option, "", group["name"], group["required_count"]))
+    return buffer.getvalue()
+
+
+# ---- import ----
+
+def load_json(text: str) -> list[dict[str, Any]]:
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise CatalogError([f"Invalid JSON: {e}"])
+    recipes = data.get("recipes") if isinstance(data, dict) else data
+    if not isinstance(recipes, list):
+        raise CatalogError(["Expected a list of recipes or {\"recipes\": [...]}"])
+    return recipes
+
+
+def load_csv(text: str) -> list[dict[str, Any]]:
+    reader = csv.DictReader(io.StringIO(text))
+    missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise CatalogError([f"Missing CSV column(s): {', '.join(sorted(missing))}"])
+
+    recipes: dict[str, dict[str, Any]] = {}
+    errors = []
+    for line, row in enumerate(reader, start=2):
+        recipe = recipes.setdefault(row["recipe"], {"result": row["result"], "ingredients": [], "groups": []})
+        if recipe["result"] != row["result"]:
+            errors.append(f"Line {line}: recipe {row['recipe']} has two results")
+        if row["kind"] == "ingredient":
+            recipe["ingredients"].append({"ball": row["ball"], "quantity": row["quantity"]})
+        elif row["kind"] == "option":
+            group = next((g for g in recipe["groups"] if g["name"] == row["group"]), None)
+            if group is None:
+                group = {"name": row["group"], "required_count": row["required_count"], "options": []}
+                recipe["groups"].append(group)
+            group["options"].append(row["ball"])
+        else:
+            errors.append(f"Line {line}: unknown kind {row['kind']!r}")
+    if errors:
+        raise CatalogError(errors)
+    return list(recipes.values())
+
+
+def _positive_int(value: Any, where: str, errors: list[str]) -> int:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1:
+        errors.append(f"{where}: {value!r} is not a positive integer")
+    return number
+
+
+def _items(container: dict[str, Any], key: str, kind: type, where: str, errors: list[str]) -> list:
+    """`container[key]` if it is a list of `kind` (a missing key is an empty list), else [] and an error."""
+    value = container.get(key, [])
+    if not isinstance(value, list) or not all(isinstance(item, kind) for item in value):
+        errors.append(f"{where}: {key} must be a list of {'objects' if kind is dict else 'ball names'}")
+        return []
+    return value
+
+
+def validate(recipes: list[Any]) -> list[dict[str, Any]]:
+    """
+    Check the whole file before anything is written and resolve ball names with a single
+    query. Returns recipes with ball ids, raises `CatalogError` listing every problem.
+    """
+    errors: list[str] = []
+
+    # Shape first: every level must be a list of objects (or of names for options)
+    checked = []
+    names: set[str] = set()
+    for index, recipe in enumerate(recipes, start=1):
+        if not isinstance(recipe, dict):
+            errors.append(f"Recipe {index}: expected an object, got {type(recipe).__name__}")
+            continue
+        where = f"Recipe {index} ({recipe.get('result')})"
+        ingredients = _items(recipe, "ingredients", dict, where, errors)
+        groups = [
+            (group, _items(group, "options", str, f"{where} group {group.get('name')}", errors))
+            for group in _items(recipe, "groups", dict, where, errors)
+        ]
+        names.update(
+            name for name in [recipe.get("result"), *(i.get("ball") for i in ingredients)] if isinstance(name, str)
+        )
+        for _, options in groups:
+            names.update(options)
+        checked.append((where, recipe, ingredients, groups))
+    ball_ids = dict(Ball.objects.filter(country__in=names).values_list("country", "pk"))
+
+    def resolve(name: Any, where: str) -> int | None:
+        if not isinstance(name, str) or name not in ball_ids:
+            errors.append(f"{where}: unknown ball {name!r}")
+            return None
+        return ball_ids[name]
+
+    resolved = []
+    for where, recipe, recipe_ingredients, recipe_groups in checked:
+        result_id = resolve(recipe.get("result"), where)
+        ingredients: dict[int, int] = {}
+        for ingredient in recipe_ingredients:
+            ball_id = resolve(ingredient.get("ball"), where)
+            quantity = _positive_int(ingredient.get("quantity", 1), f"{where} quantity", errors)
+            if ball_id in ingredients:
+                errors.append(f"{where}: {ingredient.get('ball')} is listed twice as an ingredient")
+            elif ball_id is not None:
+                ingredients[ball_id] = quantity
+        groups = []
+        for group, group_options in recipe_groups:
+            name = str(group.get("name") or "").strip()
+            if not name or len(name) > 100:
+                errors.append(f"{where}: group names must be 1 to 100 characters")
+            required = _positive_int(group.get("required_count", 1), f"{where} group {name}", errors)
+            options = [resolve(option, f"{where} group {name}") for option in group_options]
+            if not options:
+                errors.append(f"{where}: group {name} has no options")
+            if len(set(options)) != len(options):
+                errors.append(f"{where}: group {name} lists a ball twice")
+            groups.append({"name": name, "required_count": required, "options": sorted(set(options) - {None})})
+        if not ingredients and not groups:
+            errors.append(f"{where}: no ingredients")
+        resolved.append({"result_id": result_id, "ingredients": ingredients, "groups": groups})
+
+    if errors:
+        raise CatalogError(errors)
+    return resolved
+
+
+def _signature(result_id: int, ingredients: dict[int, int], groups: Iterable[dict[str, Any]]) -> tuple:
+    return (
+        result_id,
+        tuple(sorted(ingredients.items())),
+        tuple(sorted((g["name"], g["required_count"], tuple(sorted(g["options"]))) for g in groups)),
+    )
+
+
+def _current_signatures() -> dict[tuple, list[CraftingRecipe]]:
+    signatures: dict[tuple, list[CraftingRecipe]] = {}
+    queryset = CraftingRecipe.objects.select_related("result").prefetch_related(
+        "ingredients", "ingredient_groups__options"
+    )
+    for recipe in queryset:
+        ingredients = {i.ingredient_id: i.quantity for i in recipe.ingredients.all()}
+        groups = [
+            {"name": g.name, "required_count": g.required_count, "options": [o.ball_id for o in g.options.all()]}
+            for g in recipe.ingredient_groups.all()
+        ]
+        signatures.setdefault(_signature(recipe.result_id, ingredients, groups), []).append(recipe)
+    return signatures
+
+
+def diff_catalog(resolved: list[dict[str, Any]], replace: bool = False) -> CatalogDiff:
+    """Compare validated recipes with the current catalog. Only `replace` imports remove recipes."""
+    current = _current_signatures()
+    diff = CatalogDiff()
+    for recipe in resolved:
+        signature = _signature(recipe["result_id"], recipe["ingredients"], recipe["groups"])
+        if current.get(signature):
+            current[signature].pop()
+            diff.unchanged += 1
+        else:
+            diff.added.append(recipe)
+    if replace:
+        # A changed recipe keeps its row, so its id, crafting log and daily stats: it is paired
+        # with a left over recipe of the same result, the one sharing most fixed ingredients
+        leftover = [(signature, recipe) for signature, recipes in current.items() for recipe in recipes]
+        added = []
+        for recipe in diff.added:
+            balls = set(recipe["ingredients"])
+            candidates = [i for i, (signature, _) in enumerate(leftover) if signature[0] == recipe["result_id"]]
+            if not candidates:
+                added.append(recipe)
+                continue
+            best = max(candidates, key=lambda i: len(balls.intersection(b for b, _ in leftover[i][0][1])))
+            diff.updated.append((leftover.pop(best)[1], recipe))
+        diff.added = added
+        diff.removed = [recipe for _, recipe in leftover]
+    return diff
+
+
+def import_catalog(resolved: list[dict[str, Any]], replace: bool = False, dry_run: bool = False) -> CatalogDiff:
+    """
+    Write the difference between `resolved` and the current catalog in one transaction,
+    with one bulk insert per table. Identical recipes are left untouched, changed ones
+    (`replace` only) get their ingredients and groups replaced but keep their row.
+    """
+    with transaction.atomic():
+        diff = diff_catalog(resolved, replace)
+        if dry_run:
+            return diff
+
+        if diff.removed:
+            CraftingRecipe.objects.filter(pk__in=[r.pk for r in diff.removed]).delete()
+
+        updated = [recipe for recipe, _ in diff.updated]
+        if updated:
+            CraftingIngredient.objects.filter(recipe__in=updated).delete()
+            CraftingIngredientGroup.objects.filter(recipe__in=updated).delete()
+
+        recipes = CraftingRecipe.objects.bulk_create(
+            [CraftingRecipe(result_id=recipe["result_id"]) for recipe in diff.added]
+        )
+        recipes += updated
+        written = diff.added + [data for _, data in diff.updated]
+        CraftingIngredient.objects.bulk_create(
+            [
+                CraftingIngredient(recipe=recipe, ingredient_id=ball_id, quantity=quantity)
+                for recipe, data in zip(recipes, written)
+                for ball_id, quantity in data["ingredients"].items()
+            ]
+        )
+        group_data = [(recipe, group) for recipe, data in zip(recipes, written) for group in data["groups"]]
+        groups = CraftingIngredientGroup.objects.bulk_create(
+            [
+                CraftingIngredientGroup(recipe=recipe, name=group["name"], required_count=group["required_count"])
+                for recipe, group in group_data
+            ]
+        )
+        CraftingGroupOption.objects.bulk_create(
+            [
+                CraftingGroupOption(group=group, ball_id=ball_id)
+                for group, (_, data) in zip(groups, group_data)
+                for ball_id in data["options"]
+            ]
+        )
+        # bulk_create sends no signals
+        rebuild(recipe.pk for recipe in recipes)
+    return diff
+
+
+def parse(text: str, format: str) -> list[dict[str, Any]]:
+    if format == "json":
+        return load_json(text)
+    if format == "csv":
+        return load_csv(text)
+    raise CatalogError([f"Unknown format {format!r}, use json or csv"])
@@ -0,0 +1,62 @@
+"""
+Materialized compiled recipes: one `craftingrecipe_compiled` row per recipe holding its
+requirements, which the bot loads its whole catalog from with a single table scan.
+
+Rows are rebuilt after every admin change (`craftings.signals`) and catalog import, or
+in bulk with the "Rebuild compiled recipes" admin action.
+"""
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from django.db import transaction
+
+from .analysis import RecipeRequirements, compile_catalog
+from .models import CraftingRecipeCompiled
+
+
+def requirements_json(recipe: RecipeRequirements) -> Dict[str, Any]:
+    return {
+        "fixed": {str(ball_id): quantity for ball_id, quantity in recipe.fixed.items()},
+        "groups": [[required, sorted(options)] for _, required, options in recipe.groups],
+        "null_ingredients": recipe.null_ingredients,
+    }
+
+
+def rebuild(recipe_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompile `recipe_ids` (every recipe when None) with one query per source table and
+    one upsert. Rows of deleted recipes go away with them (cascade). Returns the row count.
+    """
+    recipes, _ = compile_catalog(recipe_ids)
+    CraftingRecipeCompiled.objects.bulk_create(
+        [
+            CraftingRecipeCompiled(recipe_id=recipe.id, result_id=recipe.result_id, requirements=requirements_json(recipe))
+            for recipe in recipes
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["recipe"],
+        update_fields=["result", "requirements", "updated_at"],
+    )
+    return len(recipes)
+
+
+_pending = threading.local()
+
+
+def schedule_rebuild(recipe_id: int):
+    """
+    Rebuild a recipe once the current transaction commits (right away outside of one).
+    An inline formset saving many rows of the same recipe rebuilds it once.
+    """
+    _pending.__dict__.setdefault("ids", set()).add(recipe_id)
+    # Registered on every call: ids left over by a rolled back transaction are still in
+    # the set and must be rebuilt by the next commit. The first callback to run rebuilds
+    # them all, the others find the set empty
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    ids, _pending.ids = getattr(_pending, "ids", set()), set()
+    if ids:
+        rebuild(ids)
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from bd_models.models import Ball
+from craftings.analysis import analyze_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the crafting catalog for subsumed and ambiguous recipe pairs, recipes that can never be crafted, "
+        "overlapping requirements and duplicate group options."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="Lines shown per section (0 for all)")
+        parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+
+    def handle(self, *args, **options):
+        report = analyze_catalog()
+        if options["json"]:
+            self.stdout.write(json.dumps({
+                "subsumed": report.subsumed,
+                "ambiguous": report.ambiguous,
+                "infeasible": report.infeasible,
+                "overlapping": report.overlapping,
+                "duplicate_options": report.duplicate_options,
+            }, indent=2))
+            return
+
+        limit = options["limit"] or None
+        names = dict(Ball.objects.filter(crafted_by__isnull=False).values_list("crafted_by", "country"))
+
+        def name(recipe_id):
+            return f"#{recipe_id} ({names.get(recipe_id, '?')})"
+
+        sections = [
+            ("Subsumed (crafting the second also matches the first)",
+             [f"{name(a)} <= {name(b)}" for a, b in report.subsumed]),
+            ("Ambiguous (the minimum of one can match both; may over-report overlapping recipes)",
+             [f"{name(a)} / {name(b)}" for a, b in report.ambiguous]),
+            ("Infeasible", [f"{name(r)}: {problem}" for r, problem in report.infeasible]),
+            ("Overlapping requirements", [f"{name(r)}: {problem}" for r, problem in report.overlapping]),
+            ("Duplicate group options",
+             [f"{name(r)}: ball {ball} listed {count} times in group {group}"
+              for r, group, ball, count in report.duplicate_options]),
+        ]
+        for title, lines in sections:
+            if not lines:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{title}: {len(lines)}"))
+            for line in lines[:limit]:
+                self.stdout.write(f"  {line}")
+            if limit and len(lines) > limit:
+                self.stdout.write(f"  ... {len(lines) - limit} more")
+
+        style = self.style.WARNING if report.infeasible or report.subsumed else self.style.SUCCESS
+        self.stdout.write(style(report.summary()))
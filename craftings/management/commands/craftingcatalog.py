@@ -0,0 +1,74 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from craftings.catalog_io import (
+    CatalogError,
+    dump_csv,
+    dump_json,
+    export_catalog,
+    import_catalog,
+    parse,
+    validate,
+)
+from craftings.compiled import rebuild
+
+
+class Command(BaseCommand):
+    help = "Import or export the whole crafting catalog as JSON or CSV (balls are referenced by country)."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="action", required=True)
+
+        export = subparsers.add_parser("export", help="Write the catalog to a file or stdout")
+        export.add_argument("-o", "--output", help="Output file, stdout when omitted")
+        export.add_argument("--format", choices=("json", "csv"), default=None)
+
+        load = subparsers.add_parser("import", help="Import recipes from a file")
+        load.add_argument("file")
+        load.add_argument("--format", choices=("json", "csv"), default=None)
+        load.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete recipes that are not in the file; changed recipes are updated in place and keep their history",
+        )
+        load.add_argument("--dry-run", action="store_true", help="Only show what would change")
+
+        subparsers.add_parser("compile", help="Rebuild the compiled recipes the bot loads its catalog from")
+
+    def _format(self, options, path):
+        if options["format"]:
+            return options["format"]
+        return "csv" if path and path.lower().endswith(".csv") else "json"
+
+    def handle(self, *args, **options):
+        if options["action"] == "compile":
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuild()} compiled recipe(s)"))
+            return
+
+        if options["action"] == "export":
+            format = self._format(options, options["output"])
+            recipes = export_catalog()
+            text = dump_csv(recipes) if format == "csv" else dump_json(recipes)
+            if options["output"]:
+                Path(options["output"]).write_text(text, encoding="utf-8")
+                self.stdout.write(self.style.SUCCESS(f"Exported {len(recipes)} recipe(s)"))
+            else:
+                self.stdout.write(text)
+            return
+
+        format = self._format(options, options["file"])
+        try:
+            resolved = validate(parse(Path(options["file"]).read_text(encoding="utf-8"), format))
+            diff = import_catalog(resolved, replace=options["replace"], dry_run=options["dry_run"])
+        except CatalogError as e:
+            raise CommandError("Catalog is invalid, nothing was imported:\n" + "\n".join(e.errors))
+
+        for recipe, _ in diff.updated:
+            self.stdout.write(f"~ {recipe}")
+        for recipe in diff.removed:
+            self.stdout.write(f"- {recipe}")
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Dry run: {diff.summary()}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(diff.summary()))
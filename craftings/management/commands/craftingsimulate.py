@@ -0,0 +1,134 @@
+import csv
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from bd_models.models import Ball, BallInstance
+from craftings.catalog_io import CatalogError, parse, validate
+from craftings.simulation import DraftRecipe, read_csv_rows, simulate, write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Estimate how many players could craft each recipe of a draft catalog right now, and how many balls "
+        "it would destroy, from a snapshot of every player's inventory."
+    )
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="action", required=True)
+
+        snapshot = subparsers.add_parser("snapshot", help="Export non-special ball counts of every player")
+        snapshot.add_argument("-o", "--output", required=True, help="Snapshot file, CSV when it ends with .csv")
+
+        run = subparsers.add_parser("run", help="Evaluate a draft catalog against a snapshot")
+        run.add_argument("snapshot", help="Snapshot file written by `snapshot`, or a player_id,ball_id,count CSV")
+        run.add_argument("catalog", help="Draft catalog, in the `craftingcatalog` JSON or CSV format")
+        run.add_argument("--format", choices=("json", "csv"), default=None, help="Catalog format")
+        run.add_argument("--workers", type=int, default=None, help="Processes to use (default: one per CPU)")
+        run.add_argument("--limit", type=int, default=20, help="Recipes listed (0 for all)")
+        run.add_argument("--json", action="store_true", help="Print the full report as JSON")
+
+    def _rows(self):
+        queryset = (
+            BallInstance.objects.filter(special__isnull=True)
+            .values("player_id", "ball_id")
+            .annotate(count=Count("id"))
+            .order_by("player_id", "ball_id")
+            .values_list("player_id", "ball_id", "count")
+        )
+        return queryset.iterator(chunk_size=50_000)
+
+    def handle(self, *args, **options):
+        if options["action"] == "snapshot":
+            self._snapshot(options["output"])
+        else:
+            self._run(options)
+
+    def _snapshot(self, output: str):
+        start = time.monotonic()
+        if output.lower().endswith(".csv"):
+            players, entries = set(), 0
+            with open(output, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(("player_id", "ball_id", "count"))
+                for row in self._rows():
+                    writer.writerow(row)
+                    players.add(row[0])
+                    entries += 1
+            players = len(players)
+        else:
+            players, entries = write_snapshot(output, self._rows())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {players} player(s), {entries} ball count(s) in {time.monotonic() - start:.1f}s"
+        ))
+
+    def _run(self, options):
+        path = options["catalog"]
+        format = options["format"] or ("csv" if path.lower().endswith(".csv") else "json")
+        try:
+            resolved = validate(parse(Path(path).read_text(encoding="utf-8"), format))
+        except CatalogError as e:
+            raise CommandError("Draft catalog is invalid:\n" + "\n".join(e.errors))
+        recipes = [DraftRecipe.from_resolved(recipe) for recipe in resolved]
+
+        start = time.monotonic()
+        snapshot_path, converted = options["snapshot"], None
+        if snapshot_path.lower().endswith(".csv"):
+            # Workers memory map the columnar form, convert once
+            fd, converted = tempfile.mkstemp(suffix=".craftsnp")
+            os.close(fd)
+            try:
+                write_snapshot(converted, read_csv_rows(snapshot_path))
+            except (KeyError, ValueError) as e:
+                os.unlink(converted)
+                raise CommandError(f"Could not read {snapshot_path}: {e}")
+            snapshot_path = converted
+        try:
+            report = simulate(snapshot_path, recipes, workers=options["workers"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if converted:
+                os.unlink(converted)
+        elapsed = time.monotonic() - start
+
+        data = report.to_dict()
+        if options["json"]:
+            self.stdout.write(json.dumps(data, indent=2))
+            return
+
+        names = dict(Ball.objects.values_list("pk", "country"))
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{report.players} player(s) x {len(recipes)} recipe(s) in {elapsed:.1f}s"
+        ))
+        self.stdout.write(self.style.MIGRATE_HEADING("Recipes craftable per player"))
+        for bucket, players in data["recipes_per_player"].items():
+            self.stdout.write(f"  {bucket:>6}: {players}")
+        spread = data["players_per_recipe"]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Players per recipe: p50 {spread['p50']}, p90 {spread['p90']}, p99 {spread['p99']}, max {spread['max']}"
+        ))
+
+        limit = options["limit"] or None
+        ranked = sorted(data["recipes"], key=lambda recipe: recipe["players"], reverse=True)
+        self.stdout.write(self.style.MIGRATE_HEADING("Recipes by craftable players"))
+        for recipe in ranked[:limit]:
+            share = recipe["players"] / report.players if report.players else 0
+            self.stdout.write(
+                f"  #{recipe['position']} {names.get(recipe['result_id'], '?')}: {recipe['players']} "
+                f"({share:.1%}), destroys {recipe['balls_destroyed_once']} ball(s) if each crafts once, "
+                f"up to {recipe['balls_destroyed_max']}"
+            )
+        if limit and len(ranked) > limit:
+            self.stdout.write(f"  ... {len(ranked) - limit} more")
+
+        destroyed = data["balls_destroyed"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Balls destroyed: {destroyed['each_player_crafts_once']} if every player crafts each recipe they can "
+            f"once, up to {destroyed['every_possible_craft']}"
+        ))
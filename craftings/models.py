@@ -8,7 +8,7 @@ from django.core.cache import cache
 from django.db import models
 from django.utils.safestring import SafeText, mark_safe
 from django.utils.timezone import now
-from bd_models.models import Ball, Player 
+from bd_models.models import Ball, Player, Special 
 from ballsdex.settings import settings 
 
 class CraftingRecipe(models.Model):
@@ -63,3 +63,93 @@ class CraftingGroupOption(models.Model):
 
     def __str__(self):
         return f"{self.ball} in {self.group.name}"
+
+
+class CraftingRecipeCompiled(models.Model):
+    """
+    Requirements of a recipe in one row, kept up to date by `craftings.signals`, so the
+    bot loads the catalog with a single table scan:
+    {"fixed": {ball_id: quantity}, "groups": [[required_count, [ball_id, ...]]], "null_ingredients": n}
+    """
+    recipe = models.OneToOneField(
+        "CraftingRecipe", on_delete=models.CASCADE, primary_key=True, related_name="compiled"
+    )
+    result = models.ForeignKey(Ball, on_delete=models.CASCADE, related_name="+")
+    requirements = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = "craftingrecipe_compiled"
+
+    def __str__(self):
+        return f"Compiled {self.recipe}"
+
+
+class CraftingLog(models.Model):
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name="crafting_logs")
+    recipe = models.ForeignKey(
+        "CraftingRecipe", on_delete=models.SET_NULL, null=True, blank=True, related_name="logs"
+    )
+    result_ball = models.ForeignKey(Ball, on_delete=models.CASCADE, related_name="+")
+    result_instance_id = models.IntegerField(help_text="Instance ID of the crafted ball")
+    result_attack_bonus = models.IntegerField(default=0)
+    result_health_bonus = models.IntegerField(default=0)
+    special = models.ForeignKey(Special, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    consumed = models.JSONField(default=list, help_text="Consumed instances with their ball and stats")
+    crafted_at = models.DateTimeField(db_index=True)
+    duration_ms = models.IntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = "craftinglog"
+        indexes = [models.Index(fields=("player", "-crafted_at"))]
+
+    def __str__(self):
+        return f"Craft #{self.pk} of {self.result_ball}"
+
+
+class CraftingDailyStat(models.Model):
+    recipe = models.ForeignKey("CraftingRecipe", on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    craft_count = models.PositiveIntegerField(default=0)
+    balls_consumed = models.PositiveIntegerField(default=0)
+    attack_delta_sum = models.BigIntegerField(default=0)
+    health_delta_sum = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = "craftingdailystat"
+        unique_together = ("recipe", "day")
+        indexes = [models.Index(fields=("-day",))]
+
+    def __str__(self):
+        return f"{self.recipe} on {self.day}"
+
+
+class CraftingDailyBallConsumption(models.Model):
+    recipe = models.ForeignKey("CraftingRecipe", on_delete=models.CASCADE, related_name="daily_consumption")
+    day = models.DateField()
+    ball = models.ForeignKey(Ball, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = "craftingdailyballconsumption"
+        unique_together = ("recipe", "day", "ball")
+        indexes = [models.Index(fields=("-day", "ball"))]
+
+    def __str__(self):
+        return f"{self.count}x {self.ball} for {self.recipe} on {self.day}"
+
+
+class CraftingNotificationOptIn(models.Model):
+    player = models.OneToOneField(Player, on_delete=models.CASCADE, related_name="crafting_notifications")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        managed = True
+        db_table = "craftingnotificationoptin"
+
+    def __str__(self):
+        return f"Recipe notifications for {self.player}"
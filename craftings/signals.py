@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .compiled import schedule_rebuild
+from .models import CraftingGroupOption, CraftingIngredient, CraftingIngredientGroup, CraftingRecipe
+
+
+@receiver(post_save, sender=CraftingRecipe)
+def recipe_saved(sender, instance: CraftingRecipe, raw: bool = False, **kwargs):
+    if not raw:
+        schedule_rebuild(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=CraftingIngredient)
+@receiver((post_save, post_delete), sender=CraftingIngredientGroup)
+def requirement_changed(sender, instance, raw: bool = False, **kwargs):
+    if not raw:
+        schedule_rebuild(instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=CraftingGroupOption)
+def option_changed(sender, instance: CraftingGroupOption, raw: bool = False, **kwargs):
+    if raw:
+        return
+    # The group may already be deleted (cascade), its own signal covers the recipe then
+    recipe_id = CraftingIngredientGroup.objects.filter(pk=instance.group_id).values_list("recipe_id", flat=True).first()
+    if recipe_id is not None:
+        schedule_rebuild(recipe_id)
@@ -0,0 +1,321 @@
+"""
+Offline economy simulation: how many players could craft each recipe of a draft
+catalog right now, and how many balls that would destroy.
+
+Inventories come from a snapshot file holding one ball_id -> count vector per player
+in columnar form (compressed sparse rows)::
+
+    header   magic "CRAFTSNP", version, player count, entry count (32 bytes)
+    int64    player_ids[players]
+    int64    offsets[players + 1]     entries of player i are offsets[i]:offsets[i + 1]
+    int32    ball_ids[entries]
+    int32    counts[entries]
+
+The file is memory mapped by every worker process, so a million players are never
+copied or pickled; workers only receive a range of player positions and send back
+per-recipe totals. Each player is checked against the recipes indexed under a ball
+they own (one "pivot" ball per recipe, a ball every crafting input must contain),
+not against the whole catalog.
+
+This module only uses the standard library so worker processes do not need Django.
+"""
+from __future__ import annotations
+
+import csv
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator
+
+MAGIC = b"CRAFTSNP"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")  # magic, version, padding, players, entries
+CHUNK_PLAYERS = 20_000
+
+# Bucket upper bounds for "recipes craftable per player"
+RECIPES_PER_PLAYER_BUCKETS = (0, 1, 2, 5, 10, 20, 50)
+
+
+# ---- snapshot files ----
+
+def write_snapshot(path: str, rows: Iterable[tuple[int, int, int]]) -> tuple[int, int]:
+    """
+    Write (player_id, ball_id, count) rows, grouped by player, to a snapshot file.
+    Returns (players, entries).
+    """
+    player_ids = array("q")
+    offsets = array("q", [0])
+    entries = 0
+    seen = set()
+    with tempfile.TemporaryFile() as ball_file, tempfile.TemporaryFile() as count_file:
+        ball_buffer, count_buffer = array("i"), array("i")
+        current = None
+        for player_id, ball_id, count in rows:
+            if player_id != current:
+                if player_id in seen:
+                    raise ValueError(f"Rows of player {player_id} are not grouped together")
+                if current is not None:
+                    offsets.append(entries)
+                seen.add(player_id)
+                player_ids.append(player_id)
+                current = player_id
+            ball_buffer.append(ball_id)
+            count_buffer.append(count)
+            entries += 1
+            if len(ball_buffer) >= 1 << 20:
+                ball_buffer.tofile(ball_file)
+                count_buffer.tofile(count_file)
+                ball_buffer, count_buffer = array("i"), array("i")
+        ball_buffer.tofile(ball_file)
+        count_buffer.tofile(count_file)
+        if current is not None:
+            offsets.append(entries)
+
+        with open(path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, VERSION, 0, len(player_ids), entries))
+            player_ids.tofile(out)
+            offsets.tofile(out)
+            for column in (ball_file, count_file):
+                column.seek(0)
+                while chunk := column.read(1 << 24):
+                    out.write(chunk)
+    return len(player_ids), entries
+
+
+def read_csv_rows(path: str) -> Iterator[tuple[int, int, int]]:
+    """(player_id, ball_id, count) rows of a CSV snapshot with those three columns."""
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield int(row["player_id"]), int(row["ball_id"]), int(row["count"])
+
+
+class Snapshot:
+    """Read-only, memory mapped view of a snapshot file."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.players, self.entries = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a crafting snapshot (version {VERSION})")
+        view = self._view = memoryview(self._map)
+        position = HEADER.size
+
+        def column(fmt: str, length: int, size: int):
+            nonlocal position
+            data = view[position:position + length * size].cast(fmt)
+            position += length * size
+            return data
+
+        self.player_ids = column("q", self.players, 8)
+        self.offsets = column("q", self.players + 1, 8)
+        self.ball_ids = column("i", self.entries, 4)
+        self.counts = column("i", self.entries, 4)
+
+    def inventory(self, position: int) -> dict[int, int]:
+        start, stop = self.offsets[position], self.offsets[position + 1]
+        return dict(zip(self.ball_ids[start:stop], self.counts[start:stop]))
+
+    def close(self):
+        for name in ("player_ids", "offsets", "ball_ids", "counts", "_view"):
+            getattr(self, name).release()
+        self._map.close()
+        self._file.close()
+
+
+# ---- matching ----
+
+@dataclass
+class DraftRecipe:
+    result_id: int
+    fixed: dict[int, int] = field(default_factory=dict)  # ball_id -> quantity
+    groups: list[tuple[int, frozenset]] = field(default_factory=list)  # (required, option ball_ids)
+
+    @property
+    def size(self) -> int:
+        """Balls consumed by one craft."""
+        return sum(self.fixed.values()) + sum(required for required, _ in self.groups)
+
+    @classmethod
+    def from_resolved(cls, recipe: dict[str, Any]) -> "DraftRecipe":
+        """From a recipe validated by `catalog_io.validate`."""
+        return cls(
+            recipe["result_id"],
+            dict(recipe["ingredients"]),
+            [(group["required_count"], frozenset(group["options"])) for group in recipe["groups"]],
+        )
+
+
+def times_craftable(recipe: DraftRecipe, counts: dict[int, int]) -> int:
+    """
+    How many times in a row `recipe` can be crafted. Requirements are checked
+    independently, like the bot's matcher, so this is an upper bound when a ball
+    counts for two of them.
+    """
+    times = None
+    for ball_id, quantity in recipe.fixed.items():
+        possible = counts.get(ball_id, 0) // quantity
+        if not possible:
+            return 0
+        times = possible if times is None else min(times, possible)
+    for required, options in recipe.groups:
+        possible = sum(counts.get(ball_id, 0) for ball_id in options) // required
+        if not possible:
+            return 0
+        times = possible if times is None else min(times, possible)
+    return times or 0
+
+
+def pivot_index(recipes: list[DraftRecipe]) -> dict[int, list[int]]:
+    """
+    ball_id -> positions of the recipes a player owning that ball must be checked for.
+    A recipe is listed under one fixed ingredient (the one fewest recipes use), or under
+    every option of its smallest group when it has no fixed ingredient.
+    """
+    usage = Counter()
+    for recipe in recipes:
+        usage.update(recipe.fixed)
+        for _, options in recipe.groups:
+            usage.update(options)
+
+    index: dict[int, list[int]] = {}
+    for position, recipe in enumerate(recipes):
+        if recipe.fixed:
+            pivots = [min(recipe.fixed, key=lambda ball_id: usage[ball_id])]
+        elif recipe.groups:
+            pivots = min((options for _, options in recipe.groups), key=len)
+        else:
+            continue
+        for ball_id in pivots:
+            index.setdefault(ball_id, []).append(position)
+    return index
+
+
+# ---- workers ----
+
+_snapshot: Snapshot | None = None
+_recipes: list[DraftRecipe] = []
+_index: dict[int, list[int]] = {}
+
+
+def _init_worker(path: str, recipes: list[DraftRecipe], index: dict[int, list[int]]):
+    global _snapshot, _recipes, _index
+    _snapshot = Snapshot(path)
+    _recipes = recipes
+    _index = index
+
+
+def _evaluate(start: int, stop: int) -> tuple[list[int], list[int], Counter]:
+    """Per recipe craftable players and total possible crafts for players start:stop."""
+    players = [0] * len(_recipes)
+    crafts = [0] * len(_recipes)
+    per_player = Counter()
+    for position in range(start, stop):
+        counts = _snapshot.inventory(position)
+        candidates = set()
+        for ball_id in counts:
+            candidates.update(_index.get(ball_id, ()))
+        craftable = 0
+        for recipe_position in candidates:
+            times = times_craftable(_recipes[recipe_position], counts)
+            if times:
+                craftable += 1
+                players[recipe_position] += 1
+                crafts[recipe_position] += times
+        per_player[craftable] += 1
+    return players, crafts, per_player
+
+
+# ---- simulation ----
+
+@dataclass
+class RecipeOutcome:
+    result_id: int
+    size: int
+    players: int = 0  # players able to craft it at least once
+    crafts: int = 0  # crafts possible if every player crafted it as many times as possible
+
+    @property
+    def balls_destroyed_once(self) -> int:
+        return self.players * self.size
+
+    @property
+    def balls_destroyed_max(self) -> int:
+        return self.crafts * self.size
+
+
+@dataclass
+class SimulationReport:
+    players: int
+    recipes: list[RecipeOutcome]
+    recipes_per_player: Counter
+
+    def percentile(self, fraction: float) -> int:
+        values = sorted(outcome.players for outcome in self.recipes)
+        return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+    def recipes_per_player_buckets(self) -> dict[str, int]:
+        buckets: dict[str, int] = {}
+        lower = 0
+        for bound in RECIPES_PER_PLAYER_BUCKETS:
+            label = str(bound) if bound == lower else f"{lower}-{bound}"
+            buckets[label] = sum(n for craftable, n in self.recipes_per_player.items() if lower <= craftable <= bound)
+            lower = bound + 1
+        buckets[f">{RECIPES_PER_PLAYER_BUCKETS[-1]}"] = sum(
+            n for craftable, n in self.recipes_per_player.items() if craftable > RECIPES_PER_PLAYER_BUCKETS[-1]
+        )
+        return buckets
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "players": self.players,
+            "recipes_per_player": self.recipes_per_player_buckets(),
+            "players_per_recipe": {
+                "p50": self.percentile(0.5),
+                "p90": self.percentile(0.9),
+                "p99": self.percentile(0.99),
+                "max": max((outcome.players for outcome in self.recipes), default=0),
+            },
+            "balls_destroyed": {
+                "each_player_crafts_once": sum(outcome.balls_destroyed_once for outcome in self.recipes),
+                "every_possible_craft": sum(outcome.balls_destroyed_max for outcome in self.recipes),
+            },
+            "recipes": [
+                {
+                    "position": position,
+                    "result_id": outcome.result_id,
+                    "players": outcome.players,
+                    "crafts": outcome.crafts,
+                    "balls_destroyed_once": outcome.balls_destroyed_once,
+                    "balls_destroyed_max": outcome.balls_destroyed_max,
+                }
+                for position, outcome in enumerate(self.recipes, start=1)
+            ],
+        }
+
+
+def simulate(snapshot_path: str, recipes: list[DraftRecipe], workers: int | None = None) -> SimulationReport:
+    """Evaluate every player of the snapshot against every recipe, across `workers` processes."""
+    snapshot = Snapshot(snapshot_path)
+    total = snapshot.players
+    snapshot.close()
+
+    index = pivot_index(recipes)
+    outcomes = [RecipeOutcome(recipe.result_id, recipe.size) for recipe in recipes]
+    per_player = Counter()
+    chunks = [(start, min(total, start + CHUNK_PLAYERS)) for start in range(0, total, CHUNK_PLAYERS)]
+
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(snapshot_path, recipes, index)
+    ) as pool:
+        for players, crafts, counter in pool.map(_evaluate, *zip(*chunks)) if chunks else ():
+            for outcome, p, c in zip(outcomes, players, crafts):
+                outcome.players += p
+                outcome.crafts += c
+            per_player.update(counter)
+    return SimulationReport(total, outcomes, per_player)